@@ -11,8 +11,9 @@ sys.path.append(os.getcwd())
 
 from src.services.paper_service import PaperService
 from src.services.image_service import ImageService
-from src.core.processor import Processor
 from src.core.database import db
+from src.core.batcher import text_query_batcher, clip_query_batcher
+from src.core.model_loader import ModelLoader
 
 # --- 页面配置 ---
 st.set_page_config(
@@ -22,6 +23,14 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- 模型预加载 (按配置 preload_models，每个服务进程只执行一次) ---
+@st.cache_resource
+def preload_models():
+    ModelLoader.preload()
+    return dict(ModelLoader.load_times)
+
+preload_models()
+
 # --- 自定义 CSS 美化 ---
 st.markdown("""
 <style>
@@ -71,7 +80,15 @@ with st.sidebar:
     )
     
     st.markdown("---")
-    st.info(f"📚 Database Path:\n`{db.client._system.settings.require('persist_directory')}`")
+    st.info(f"📚 Database Path:\n`{db.describe()}`")
+    
+    with st.expander("⏱️ 查询编码统计"):
+        for batcher in (text_query_batcher, clip_query_batcher):
+            st.markdown(f"**{batcher.name}**")
+            st.json(batcher.stats(), expanded=False)
+        if db.query_cache is not None:
+            st.markdown("**query cache**")
+            st.json(db.query_cache.stats(), expanded=False)
     
     # 状态重置
     if st.button("清除缓存 / Reload"):
@@ -106,6 +123,7 @@ if page == "📁 智能整理 (Auto-Org)":
             
             total_files = len(files)
             processed_data = []
+            image_paths = []
             
             status_text.write(f"🔍 发现 {total_files} 个文件，开始处理...")
             
@@ -143,19 +161,29 @@ if page == "📁 智能整理 (Auto-Org)":
                         })
                         
                     elif ext in ['.jpg', '.png', '.jpeg']:
-                        ImageService.index_images(file_path)
-                        processed_data.append({
-                            "Filename": filename,
-                            "Type": "Image",
-                            "Topic": "Image Index",
-                            "Status": "✅ Indexed"
-                        })
+                        # 图片先收集，循环结束后一次性索引 (解码与 CLIP 推理重叠)
+                        image_paths.append(file_path)
                     else:
                         processed_data.append({"Filename": filename, "Type": ext, "Topic": "-", "Status": "Skipped"})
                         
                 except Exception as e:
                     processed_data.append({"Filename": filename, "Type": ext, "Topic": "Error", "Status": f"❌ {str(e)}"})
             
+            if image_paths:
+                status_text.write(f"🖼️ 正在索引 {len(image_paths)} 张图片...")
+                try:
+                    statuses = ImageService.index_images(image_paths)
+                except Exception as e:
+                    statuses = {p: str(e) for p in image_paths}
+                for img_path in image_paths:
+                    error = statuses.get(img_path, "Not indexed")
+                    processed_data.append({
+                        "Filename": os.path.basename(img_path),
+                        "Type": "Image",
+                        "Topic": "Image Index" if error is None else "Error",
+                        "Status": "✅ Indexed" if error is None else f"❌ {error}"
+                    })
+            
             progress_bar.progress(100)
             status_text.success("🎉 整理完成！")
             
@@ -178,11 +206,15 @@ elif page == "🔍 文献深度搜索 (Deep Search)":
 
     if query:
         # 获取搜索结果
-        results = db.get_paper_collection().query(
-            query_embeddings=[Processor.get_text_embedding_safe(query)], # 需要一个小 helper 或者直接调 model_loader
+        # 多个会话同时搜索时，查询编码会在 batcher 中合并为一次前向计算；重复查询直接命中结果缓存
+        results = db.get_paper_collection().query_text(
+            query,
+            text_query_batcher.encode,
             n_results=3,
-            include=['documents', 'metadatas', 'distances']
+            # 不拉取整段原文，只取 id / metadata / 距离；片段与全文按需从 DocStore 读取
+            include=['metadatas', 'distances']
         )
+        snippets = PaperService.fetch_texts(results['ids'][0], max_chars=200)
         
         # 布局
         c1, c2 = st.columns([1, 1])
@@ -196,7 +228,8 @@ elif page == "🔍 文献深度搜索 (Deep Search)":
             if not results['ids'][0]:
                 st.warning("没有找到相关结果。")
             
-            for i, doc in enumerate(results['documents'][0]):
+            for i, chunk_id in enumerate(results['ids'][0]):
+                doc = snippets.get(chunk_id, "")
                 meta = results['metadatas'][0][i]
                 score = 1 - results['distances'][0][i] # Cosine Distance -> Similarity (Approx)
                 
@@ -221,7 +254,7 @@ elif page == "🔍 文献深度搜索 (Deep Search)":
                         st.session_state.selected_paper = {
                             "path": file_path,
                             "page": page_num,
-                            "doc": doc
+                            "chunk_id": chunk_id
                         }
 
         # 右侧预览区
@@ -233,7 +266,9 @@ elif page == "🔍 文献深度搜索 (Deep Search)":
                 
                 # [MODIFIED] 用户要求移除预览图，仅显示文字
                 st.markdown("**本页命中内容:**")
-                st.info(p_info['doc'])
+                # 只有被选中预览的结果才读取全文
+                full_text = PaperService.fetch_texts([p_info['chunk_id']]).get(p_info['chunk_id'], "")
+                st.info(full_text)
             else:
                 st.markdown("""
                 <div style="text-align: center; padding: 50px; color: gray;">
@@ -252,11 +287,9 @@ elif page == "🖼️ 以文搜图 (Image Search)":
         
         # 搜索 (复用 ImageService 逻辑)
         # 以前的 ImageService 直接 print 了，我们需要稍微改一下或者直接在这里调 DB (更灵活)
-        from src.core.model_loader import get_text_embedding_for_clip
-        
-        q_emb = get_text_embedding_for_clip(img_query)
-        results = db.get_image_collection().query(
-            query_embeddings=[q_emb],
+        results = db.get_image_collection().query_text(
+            img_query,
+            clip_query_batcher.encode,
             n_results=6,
             include=['metadatas', 'distances']
         )
@@ -304,12 +337,3 @@ elif page == "💬 图像问答 (VQA)":
                     st.success(f"**Answer:** {answer}")
         else:
             st.info("👈 请先在左侧上传图片。")
-
-# --- Helper function patch ---
-# 因为直接 import model_loader 可能会有相对路径问题，我们在 app.py 开头处理了 sys.path
-# 但为了简单起见，我们给 Processor 加一个临时方法或者直接调用
-def get_text_embedding_safe(text):
-    from src.core.model_loader import get_text_embedding
-    return get_text_embedding(text)
-
-Processor.get_text_embedding_safe = staticmethod(get_text_embedding_safe)
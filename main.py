@@ -5,8 +5,8 @@ import os
 # 确保 src 在路径中
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from src.services.paper_service import PaperService
-from src.services.image_service import ImageService
+# 业务模块 (torch / transformers / chromadb) 在各命令内部按需导入：
+# PDF 分片提取的工作进程以 spawn 方式启动，会重新导入本文件，顶层只保留轻量依赖
 
 app = typer.Typer(
     name="Local Multimodal AI Agent",
@@ -22,6 +22,7 @@ def add_paper(
     """
     添加论文到数据库，并根据 Topics 自动分类移动。
     """
+    from src.services.paper_service import PaperService
     topic_list = None
     if topics:
         topic_list = [t.strip() for t in topics.split(",") if t.strip()]
@@ -35,6 +36,7 @@ def search_paper(
     """
     语义搜索论文。
     """
+    from src.services.paper_service import PaperService
     PaperService.search_paper(query)
 
 @app.command()
@@ -44,6 +46,7 @@ def index_image(
     """
     索引一张图片或整个文件夹的图片。
     """
+    from src.services.image_service import ImageService
     ImageService.index_images(path)
 
 @app.command()
@@ -53,20 +56,28 @@ def search_image(
     """
     以文搜图。
     """
+    from src.services.image_service import ImageService
     ImageService.search_image(query)
 
 @app.command()
 def ingest(
     folder_path: str = typer.Argument(..., help="要扫描的文件夹路径"),
-    topics: str = typer.Option(None, help="分类主题列表 (仅对论文有效)")
+    topics: str = typer.Option(None, help="分类主题列表 (仅对论文有效)"),
+    preload: str = typer.Option(None, help="开始前并行预加载的模型，逗号分隔，例如 'text,clip' (默认读取配置 preload_models)")
 ):
     """
     [新增] 批量导入：自动递归扫描文件夹，识别 PDF 和图片并入库。
     """
+    from src.services.paper_service import PaperService
+    from src.services.image_service import ImageService
+    from src.core.model_loader import ModelLoader
     if not os.path.exists(folder_path):
         print(f"Error: Path {folder_path} does not exist.")
         return
 
+    # 与后续的文件扫描、PDF 提取无关，提前并行加载，避免第一篇论文 / 图片等待冷启动
+    ModelLoader.preload([m.strip() for m in preload.split(",") if m.strip()] if preload else None)
+
     topic_list = None
     if topics:
         topic_list = [t.strip() for t in topics.split(",") if t.strip()]
@@ -75,6 +86,7 @@ def ingest(
     
     pdf_count = 0
     img_count = 0
+    image_paths = []
     
     for root, _, files in os.walk(folder_path):
         for file in files:
@@ -91,16 +103,18 @@ def ingest(
                 except Exception as e:
                     print(f"Failed to process PDF {file}: {e}")
             
-            # 处理图片
+            # 处理图片：先收集，扫描结束后一次性索引，让解码线程池与 CLIP 推理重叠
             elif ext in ['.jpg', '.jpeg', '.png', '.bmp', '.webp']:
-                # ImageService.index_images 默认是处理整个 folder，这里我们也可以复用它，或者改一下
-                # 现在的 ImageService.index_images 是接收 folder 或 file 的，所以可以直接传 file_path
                 print(f"[Found Image] {file}")
-                try:
-                    ImageService.index_images(file_path)
-                    img_count += 1
-                except Exception as e:
-                    print(f"Failed to process Image {file}: {e}")
+                image_paths.append(file_path)
+
+    if image_paths:
+        print(f"\nIndexing {len(image_paths)} images...")
+        try:
+            statuses = ImageService.index_images(image_paths)
+            img_count = sum(1 for error in statuses.values() if error is None)
+        except Exception as e:
+            print(f"Failed to process images: {e}")
 
     print("\n" + "="*50)
     print(f"Ingestion Complete.")
@@ -108,6 +122,150 @@ def ingest(
     print(f"Images processed: {img_count}")
     print("="*50)
 
+@app.command()
+def serve(
+    host: str = typer.Option(None, help="监听地址 (默认读取配置 server_host)"),
+    port: int = typer.Option(None, help="监听端口 (默认读取配置 server_port)")
+):
+    """
+    启动本地索引服务：由该进程独占数据库，CLI 与 UI 设置 LMA_DB_MODE=server 后通过 HTTP 访问。
+    """
+    from src.core.database import Database
+    Database.serve(host, port)
+
+@app.command(name="export-index")
+def export_index(
+    output_path: str = typer.Argument(..., help="快照文件路径 (.npz)"),
+    compress: bool = typer.Option(True, help="是否压缩快照")
+):
+    """
+    导出索引快照 (float16 向量 + 列式 metadata/documents)，用于迁移或备份。
+    """
+    from src.core.snapshot import Snapshot
+    Snapshot.export_index(output_path, compress=compress)
+
+@app.command(name="import-index")
+def import_index(
+    snapshot_path: str = typer.Argument(..., help="export-index 生成的快照文件"),
+    batch_size: int = typer.Option(None, help="每批写入条数 (默认使用数据库允许的最大批量)")
+):
+    """
+    从快照批量恢复索引，不需要重新运行任何模型。
+    """
+    from src.core.snapshot import Snapshot
+    Snapshot.import_index(snapshot_path, batch_size=batch_size)
+
+@app.command(name="sweep-hnsw")
+def sweep_hnsw(
+    collection: str = typer.Option("papers", help="使用哪个线上 collection 的向量 (papers / images)"),
+    synthetic: int = typer.Option(0, help="大于 0 时改用该数量的合成向量，不读取线上数据"),
+    dim: int = typer.Option(384, help="合成向量维度"),
+    queries: int = typer.Option(200, help="查询数量"),
+    k: int = typer.Option(10, help="recall@k 中的 k"),
+    space: str = typer.Option("l2", help="距离空间列表，逗号分隔 (l2,cosine,ip)"),
+    m: str = typer.Option("16", help="hnsw:M 取值列表，逗号分隔"),
+    construction_ef: str = typer.Option("100", help="hnsw:construction_ef 取值列表"),
+    search_ef: str = typer.Option("10,50,100", help="hnsw:search_ef 取值列表")
+):
+    """
+    HNSW 参数扫描：对比暴力搜索的 recall@k 与 p50/p99 查询延迟。
+    """
+    from src.core.index_eval import HnswSweep
+
+    def parse_ints(value):
+        return [int(v) for v in value.split(",") if v.strip()]
+
+    HnswSweep.run(
+        collection_name=collection, synthetic=synthetic, dim=dim, num_queries=queries, k=k,
+        spaces=[s.strip() for s in space.split(",") if s.strip()],
+        ms=parse_ints(m), construction_efs=parse_ints(construction_ef), search_efs=parse_ints(search_ef)
+    )
+
+@app.command(name="bench-shards")
+def bench_shards(
+    shards: str = typer.Option("1,2,4,8", help="要测试的分片数列表，逗号分隔"),
+    collection: str = typer.Option("papers", help="使用哪个线上 collection 的向量 (papers / images)"),
+    synthetic: int = typer.Option(0, help="大于 0 时改用该数量的合成向量，不读取线上数据"),
+    dim: int = typer.Option(384, help="合成向量维度"),
+    queries: int = typer.Option(200, help="查询数量"),
+    k: int = typer.Option(10, help="top-k")
+):
+    """
+    分片扩展性测试：写入耗时、查询延迟，以及与不分片结果的一致率。
+    """
+    from src.core.index_eval import ShardBenchmark
+    ShardBenchmark.run(
+        [int(n) for n in shards.split(",") if n.strip()],
+        collection_name=collection, synthetic=synthetic, dim=dim, num_queries=queries, k=k
+    )
+
+@app.command(name="bench-embed")
+def bench_embed(
+    path: str = typer.Argument(..., help="PDF 文件或包含 PDF 的文件夹"),
+    batch_size: int = typer.Option(32, help="对照组的固定批大小"),
+    repeats: int = typer.Option(3, help="重复次数 (取最快一次)")
+):
+    """
+    文本编码吞吐量对比：固定批大小 vs 按 token 长度分桶 (token 预算)。
+    """
+    from src.core.embed_scheduler import EmbedBenchmark
+    if os.path.isdir(path):
+        pdf_paths = [os.path.join(root, f) for root, _, fs in os.walk(path) for f in fs if f.lower().endswith(".pdf")]
+    else:
+        pdf_paths = [path]
+    EmbedBenchmark.run(pdf_paths, fixed_batch_size=batch_size, repeats=repeats)
+
+@app.command(name="eval-projection")
+def eval_projection(
+    collection: str = typer.Option("papers", help="评估哪个 collection (papers / images)"),
+    dims: str = typer.Option("64,128,192,256", help="候选维度列表，逗号分隔"),
+    queries: int = typer.Option(200, help="查询数量"),
+    k: int = typer.Option(10, help="recall@k 中的 k"),
+    sample: int = typer.Option(20000, help="拟合 PCA 使用的样本数")
+):
+    """
+    降维评估：各候选维度相对全维度索引的 recall@k。
+    """
+    from src.core.index_eval import ProjectionEval
+    ProjectionEval.run(collection, [int(d) for d in dims.split(",") if d.strip()],
+                       num_queries=queries, k=k, sample=sample)
+
+@app.command(name="fit-projection")
+def fit_projection(
+    collection: str = typer.Option("papers", help="papers / images"),
+    dim: int = typer.Option(..., help="投影后的维度"),
+    sample: int = typer.Option(20000, help="拟合 PCA 使用的样本数")
+):
+    """
+    拟合 PCA 投影并生成降维后的 collection (<name>_pca<dim>)，全维度向量移到旁路文件，
+    随后在配置中设置对应的 projection_dim 启用。
+    """
+    from src.core.index_eval import ProjectionEval
+    ProjectionEval.fit(collection, dim, sample=sample)
+
+@app.command(name="drop-projection")
+def drop_projection(
+    collection: str = typer.Option("papers", help="papers / images")
+):
+    """
+    关闭降维：把全维度向量写回原 collection，删除 <name>_pca<dim>，随后把对应的 projection_dim 设回 0。
+    """
+    from src.core.index_eval import ProjectionEval
+    ProjectionEval.drop(collection)
+
+@app.command(name="bench-decode")
+def bench_decode(
+    path: str = typer.Argument(..., help="图片文件夹"),
+    size: int = typer.Option(224, help="低分辨率解码的目标最短边 (CLIP 224, BLIP 384)")
+):
+    """
+    图片解码对比：全分辨率 vs 低分辨率解码的单张耗时与峰值内存。
+    """
+    from src.core.processor import Processor
+    exts = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+    image_paths = [os.path.join(root, f) for root, _, fs in os.walk(path) for f in fs if f.lower().endswith(exts)]
+    Processor.benchmark_decode(image_paths, min_side=size)
+
 @app.command(name="ask-image")
 def ask_image_cli(image_path: str, question: str):
     """
@@ -115,6 +273,7 @@ def ask_image_cli(image_path: str, question: str):
     :param image_path: 图片路径
     :param question: 问题内容 (英文效果最佳)
     """
+    from src.services.image_service import ImageService
     answer = ImageService.answer_question(image_path, question)
     print(f"\n[Question]: {question}")
     print(f"[Answer]  : {answer}\n")
@@ -0,0 +1,129 @@
+import asyncio
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+from src.core.config import Config
+from src.core.model_loader import get_text_embedding, get_text_embeddings_for_clip
+
+
+class Histogram:
+    """固定分桶直方图，bounds 为各桶上界，最后一个桶收集超出部分"""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def record(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def summary(self) -> dict:
+        labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {
+            "count": self.total,
+            "mean": self.sum / self.total if self.total else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class MicroBatcher:
+    """
+    合并并发的单条查询编码请求。
+    后台线程开始收集一批时，先取走队列中已积压的请求，再最多等待 batch_window_ms 或凑满 batch_max_size 条，
+    然后对整批执行一次前向计算，并把结果分别写回各调用方的 Future。
+    线程中调用 encode()，asyncio 中 await encode_async()。
+    """
+
+    def __init__(self, name: str, encode_fn: Callable[[List[str]], List[List[float]]],
+                 window_ms: float = None, max_batch_size: int = None):
+        self.name = name
+        self._encode_fn = encode_fn
+        self._window_ms = window_ms
+        self._max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # 排队等待时间 (毫秒) 与批大小分布
+        self.queue_wait_ms = Histogram([0.5, 1, 2, 5, 10, 20, 50, 100])
+        self.batch_size = Histogram([1, 2, 4, 8, 16, 32, 64])
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def encode(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def encode_async(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self) -> dict:
+        return {
+            "queue_wait_ms": self.queue_wait_ms.summary(),
+            "batch_size": self.batch_size.summary(),
+        }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        window = (self._window_ms if self._window_ms is not None else Config.get("batch_window_ms")) / 1000
+        max_batch_size = self._max_batch_size or Config.get("batch_max_size")
+
+        batch = [self._queue.get()]
+        # 窗口从开始收集时计算，而不是第一条请求的入队时间：
+        # 上一批编码期间积压的请求入队时间早已超过窗口，按入队时间计算会退化成每批 1 条
+        deadline = time.perf_counter() + window
+        # 先取走已积压的请求
+        while len(batch) < max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        while len(batch) < max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # 跳过已被调用方取消的请求
+            batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_wait_ms.record((start - enqueued_at) * 1000)
+            self.batch_size.record(len(batch))
+
+            try:
+                embeddings = self._encode_fn([text for text, _, _ in batch])
+                for (_, future, _), emb in zip(batch, embeddings):
+                    future.set_result(emb)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+
+# 查询编码服务：论文检索 (MiniLM) 与以文搜图 (CLIP Text Encoder)
+text_query_batcher = MicroBatcher("text", get_text_embedding)
+clip_query_batcher = MicroBatcher("clip", get_text_embeddings_for_clip)
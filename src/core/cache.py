@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+
+
+class LRUCache:
+    """线程安全的定长 LRU 缓存，capacity 为 0 时不缓存"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    _MISSING = object()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key, self._MISSING)
+            if value is self._MISSING:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "capacity": self.capacity, "hits": self.hits, "misses": self.misses}
+
+
+class Generations:
+    """
+    每个 collection 的版本号。任何写操作 (add / upsert / update / delete) 都会递增。
+    版本号同时写入 <directory>/generation_<name>，其他进程 (例如另一个终端里的 ingest) 写入后，
+    本进程通过 stat 文件即可发现变化，不需要读取文件内容。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, f"generation_{name}")
+
+    def bump(self, name: str):
+        with self._lock:
+            self._local[name] = self._local.get(name, 0) + 1
+            os.makedirs(self.directory, exist_ok=True)
+            # 写临时文件再替换：inode 与 mtime 都会改变
+            tmp_path = f"{self._path(name)}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(self._local[name]))
+            os.replace(tmp_path, self._path(name))
+
+    def current(self, name: str):
+        try:
+            st = os.stat(self._path(name))
+            shared = (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            shared = None
+        return self._local.get(name, 0), shared
+
+
+class CollectionGenerations:
+    """
+    服务模式下的版本号：存放在服务端的一个小 collection 中 (每个 collection 一条记录)，
+    所有客户端读写同一份，不依赖各客户端本地的 db_path。
+    写操作写入随机 token 而不是递增计数，多个客户端同时写入也不需要读-改-写。
+    读取结果在本地缓存 poll_interval 秒：缓存命中不需要访问服务端；本进程的写入立即可见，
+    其他客户端的写入最多延迟 poll_interval 秒才会使本进程的缓存失效。
+    """
+
+    COLLECTION_NAME = "lma_generations"
+
+    def __init__(self, client, poll_interval: float):
+        self._collection = client.get_or_create_collection(name=self.COLLECTION_NAME)
+        self.poll_interval = poll_interval
+        # name -> (token, 读取时间)
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def bump(self, name: str):
+        token = uuid.uuid4().hex
+        # Chroma 的记录必须带 embedding，这里只用 metadata，向量填占位值
+        self._collection.upsert(ids=[name], embeddings=[[0.0]], metadatas=[{"token": token}])
+        with self._lock:
+            self._local[name] = (token, time.monotonic())
+
+    def current(self, name: str):
+        with self._lock:
+            cached = self._local.get(name)
+        if cached is not None and time.monotonic() - cached[1] < self.poll_interval:
+            return cached[0]
+        metadatas = self._collection.get(ids=[name], include=["metadatas"])["metadatas"]
+        token = metadatas[0]["token"] if metadatas else None
+        with self._lock:
+            self._local[name] = (token, time.monotonic())
+        return token
+
+
+class CachedCollection:
+    """
+    为 collection 加上查询结果缓存。
+    缓存 key 包含 (collection, 版本号, 查询向量或文本, n_results, 过滤条件)，写操作会递增版本号，
+    因此缓存结果不会过期；旧版本的条目不会再被命中，由 LRU 自然淘汰。
+    其余方法 (get / count 等) 直接转发给底层 collection。
+    """
+
+    def __init__(self, name: str, collection, cache: LRUCache, generations: Generations):
+        self.name = name
+        self._collection = collection
+        self._cache = cache
+        self._generations = generations
+
+    def __getattr__(self, attr):
+        return getattr(self._collection, attr)
+
+    def _write(self, method: str, *args, **kwargs):
+        try:
+            return getattr(self._collection, method)(*args, **kwargs)
+        finally:
+            # 即使写入中途失败，也可能已部分生效
+            self._generations.bump(self.name)
+
+    def add(self, *args, **kwargs):
+        return self._write("add", *args, **kwargs)
+
+    def upsert(self, *args, **kwargs):
+        return self._write("upsert", *args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._write("update", *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write("delete", *args, **kwargs)
+
+    def _key(self, query_key, n_results, where, where_document, include):
+        filters = json.dumps([where, where_document, include], sort_keys=True, default=str)
+        return (self.name, self._generations.current(self.name), query_key, n_results, filters)
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, where_document=None, include=None):
+        embeddings_key = np.asarray(query_embeddings, dtype=np.float32).tobytes()
+        key = self._key(("embedding", embeddings_key), n_results, where, where_document, include)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._query(query_embeddings, n_results, where, where_document, include)
+            self._cache.put(key, result)
+        return result
+
+    def query_text(self, text: str, embed_fn: Callable[[str], list], n_results: int = 10,
+                   where=None, where_document=None, include=None):
+        """
+        按查询文本缓存：命中时连 embedding 都不需要计算。
+        :param embed_fn: 未命中时把文本转为查询向量的函数
+        """
+        key = self._key(("text", text), n_results, where, where_document, include)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._query([embed_fn(text)], n_results, where, where_document, include)
+            self._cache.put(key, result)
+        return result
+
+    def _query(self, query_embeddings, n_results, where, where_document, include):
+        kwargs = {"query_embeddings": query_embeddings, "n_results": n_results,
+                  "where": where, "where_document": where_document}
+        if include is not None:
+            kwargs["include"] = include
+        return self._collection.query(**kwargs)
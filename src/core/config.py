@@ -0,0 +1,118 @@
+import json
+import os
+
+# 项目根目录 (src/core/config.py -> 上两级)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Config:
+    """
+    全局配置。优先级: 环境变量 (LMA_<KEY 大写>) > 配置文件 > 默认值。
+    配置文件默认为项目根目录下的 config.json，可通过 LMA_CONFIG 指定其他路径。
+    """
+    DEFAULTS = {
+        # 数据库存储位置
+        "db_path": os.path.join(PROJECT_ROOT, "chroma_db"),
+        # embedded: 进程内直接打开 PersistentClient
+        # server: 连接由 `python main.py serve` 启动的本地索引服务 (HTTP)
+        "db_mode": "embedded",
+        "server_host": "127.0.0.1",
+        "server_port": 8765,
+        # 各 collection 的 HNSW 参数，例如 {"M": 32, "construction_ef": 200, "search_ef": 64, "space": "l2"}
+        # 仅在 collection 首次创建时生效；可先用 `python main.py sweep-hnsw` 评估
+        "paper_hnsw": {},
+        "image_hnsw": {},
+        # 分片数：> 1 时每个 collection 按 id 哈希拆成多个独立分片，并行写入与 scatter-gather 查询
+        # 修改分片数后需要重新导入 (export-index / import-index)
+        "num_shards": 1,
+        # 查询结果缓存条数 (LRU)，0 表示关闭
+        "query_cache_size": 1024,
+        # 服务模式下多久向服务端确认一次其他客户端的写入 (毫秒)；期间的缓存命中不访问服务端，
+        # 其他客户端写入后最多这么久才能看到新结果。0 表示每次查询都确认
+        "generation_poll_ms": 500.0,
+        # 存储前把 embedding 投影到更低维度 (PCA)，0 表示保持原始维度
+        # 启用前先用 `python main.py eval-projection` 评估，再用 `fit-projection` 拟合并生成降维后的 collection
+        "paper_projection_dim": 0,
+        "image_projection_dim": 0,
+        # 论文 chunk 原文存入旁路压缩存储 (db_path/docstore.sqlite)，不再写入向量库的 document 字段
+        "doc_store": True,
+        # 各进程 / 客户端共用的旁路文件目录 (docstore.sqlite、投影矩阵、全维度向量)，空字符串表示 db_path
+        # 服务模式下需设为索引服务的 db_path，未设置时服务模式不启用 doc_store 与降维
+        "shared_path": "",
+        # 图片解码线程数，与模型推理重叠执行
+        "decode_workers": 4,
+        # 超过该像素数的图片直接跳过 (损坏或超大图片不会占满内存)
+        "image_max_pixels": 100_000_000,
+        # 解码后超过该像素数的图片 (无法降分辨率解码的大 PNG 等) 串行解码，限制峰值内存
+        "image_large_decode_pixels": 16_000_000,
+        # PDF 页数达到该阈值时按页码区间分片到多进程提取
+        "pdf_shard_min_pages": 300,
+        # 分片提取的进程数，0 表示 min(CPU 核数, 4)；进程池在多篇 PDF 之间复用
+        "extract_workers": 0,
+        # 并发查询合并：收集窗口 (毫秒) 与单批最大条数
+        "batch_window_ms": 5.0,
+        "batch_max_size": 32,
+        # 批量编码时每批补齐后的 token 上限，以及每批最多条数
+        "embed_token_budget": 8192,
+        "embed_max_batch_size": 256,
+        # 启动时并行预加载的模型 (text / clip / blip)，空列表表示全部按需加载
+        "preload_models": [],
+        # 冷启动时间预算 (秒)，预加载超出时打印警告，0 表示不检查
+        "model_load_budget_s": 0.0,
+        # 模型权重改为 mmap 映射缓存文件，多个进程 (UI / CLI / 服务) 共享同一份物理内存
+        # 关闭时每个进程各自持有一份权重
+        "mmap_weights": False,
+        "weights_cache_dir": os.path.join(PROJECT_ROOT, "model_cache"),
+    }
+
+    _values = None
+
+    @classmethod
+    def load(cls):
+        if cls._values is None:
+            values = dict(cls.DEFAULTS)
+
+            config_file = os.environ.get("LMA_CONFIG", os.path.join(PROJECT_ROOT, "config.json"))
+            if os.path.isfile(config_file):
+                with open(config_file, "r", encoding="utf-8") as f:
+                    values.update(json.load(f))
+
+            for key, default in cls.DEFAULTS.items():
+                env_value = os.environ.get(f"LMA_{key.upper()}")
+                if env_value is not None:
+                    values[key] = cls._coerce(env_value, default)
+
+            cls._values = values
+        return cls._values
+
+    @classmethod
+    def get(cls, key: str):
+        return cls.load()[key]
+
+    @classmethod
+    def shared_dir(cls):
+        """
+        旁路文件 (DocStore、投影) 所在目录。
+        服务模式下各客户端的 db_path 互不相同，必须显式配置 shared_path，未配置时返回 None。
+        """
+        if cls.get("shared_path"):
+            return cls.get("shared_path")
+        return None if cls.get("db_mode") == "server" else cls.get("db_path")
+
+    @staticmethod
+    def _coerce(value: str, default):
+        """按默认值的类型转换环境变量字符串"""
+        if isinstance(default, bool):
+            return value.strip().lower() in ("1", "true", "yes", "on")
+        if isinstance(default, int):
+            return int(value)
+        if isinstance(default, float):
+            return float(value)
+        if isinstance(default, list):
+            # 支持 JSON 数组或逗号分隔: LMA_PRELOAD_MODELS=text,clip
+            if value.strip().startswith("["):
+                return json.loads(value)
+            return [v.strip() for v in value.split(",") if v.strip()]
+        if isinstance(default, dict):
+            return json.loads(value)
+        return value
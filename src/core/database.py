@@ -1,38 +1,193 @@
 import chromadb
 from chromadb.config import Settings
 import os
+from src.core.config import Config
+from src.core.sharding import ShardedCollection
+from src.core.cache import LRUCache, Generations, CollectionGenerations, CachedCollection
+from src.core.projection import Projection, ProjectedCollection, FullVectorStore, FINGERPRINT_KEY
+
+# 各 collection 对应的配置项
+HNSW_KEYS = {"papers": "paper_hnsw", "images": "image_hnsw"}
+PROJECTION_DIM_KEYS = {"papers": "paper_projection_dim", "images": "image_projection_dim"}
 
 class Database:
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
-            # 初始化 ChromaDB Client (Persistent)
-            # [FIX] 使用用户指定的纯英文路径 (分离存储，避免扫描时冲突)
-            db_path = "D:/Multi_model/peizhi/chroma_db"
+            # 延迟连接：import 时不打开数据库，第一次访问 client / collection 时才连接
+            cls._instance._client = None
+            cls._instance.paper_collection = None
+            cls._instance.image_collection = None
+            cls._instance.query_cache = None
+        return cls._instance
+
+    @property
+    def mode(self):
+        return Config.get("db_mode")
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._connect()
+        return self._client
+
+    def _connect(self):
+        if self.mode == "server":
+            # 由单独的索引服务进程独占数据库，CLI 与 UI 通过 HTTP 访问，避免多进程争用 SQLite 锁
+            host, port = Config.get("server_host"), Config.get("server_port")
+            print(f"Database Server: http://{host}:{port}")
+            self._client = chromadb.HttpClient(host=host, port=port)
+        elif self.mode == "embedded":
+            db_path = Config.get("db_path")
             if not os.path.exists(db_path):
                 os.makedirs(db_path)
             print(f"Database Path: {db_path}")
-            cls._instance.client = chromadb.PersistentClient(path=db_path)
-            
-            # 获取或创建 Collections
-            # [FIX] 移除 hnsw:space: cosine，使用默认的 L2 距离。
-            # 配合归一化的 Embedding，L2 距离排序与 Cosine 相似度完全一致，且更稳定。
-            cls._instance.paper_collection = cls._instance.client.get_or_create_collection(
-                name="papers"
-            )
-            
-            cls._instance.image_collection = cls._instance.client.get_or_create_collection(
-                name="images"
+            self._client = chromadb.PersistentClient(path=db_path)
+        else:
+            raise ValueError(f"Unknown db_mode: {self.mode} (expected 'embedded' or 'server')")
+
+        self.query_cache = LRUCache(Config.get("query_cache_size"))
+        # 服务模式下各客户端的 db_path 互不相同，版本号必须放在服务端，才能看到其他客户端的写入
+        if self.mode == "server":
+            self._generations = CollectionGenerations(self._client, Config.get("generation_poll_ms") / 1000)
+        else:
+            self._generations = Generations(Config.get("db_path"))
+
+    def _open_collection(self, name: str):
+        """
+        获取或创建 Collection。
+        [FIX] 移除 hnsw:space: cosine，使用默认的 L2 距离。
+        配合归一化的 Embedding，L2 距离排序与 Cosine 相似度完全一致，且更稳定。
+        HNSW 参数 (paper_hnsw / image_hnsw) 只在 collection 创建时生效。
+        配置了降维 (<paper|image>_projection_dim > 0) 时，HNSW 中只有投影后的 <name>_pca<dim>，
+        全维度向量在 shared_path 下的旁路文件中 (见 projection.py)；写入与查询的 embedding 统一经过投影。
+        外层再包一层查询结果缓存 (query_cache_size)，写操作递增版本号使缓存失效。
+        """
+        projection_dim = Config.get(PROJECTION_DIM_KEYS[name])
+        vectors = FullVectorStore(name)
+        active_dim = vectors.active_dim
+        if projection_dim != active_dim:
+            # 配置与实际存储不一致时直接报错，而不是打开一个空的或过期的 collection
+            if active_dim:
+                raise ValueError(
+                    f"Collection {name} is stored projected to {active_dim} dims, but {name[:-1]}_projection_dim={projection_dim}. "
+                    f"Set it to {active_dim}, or run `python main.py drop-projection --collection {name}` "
+                    f"to restore the full-dimension collection."
+                )
+            raise ValueError(
+                f"Collection {name} has no {projection_dim}-d projection in shared_path ({Config.shared_dir()}). "
+                f"Check that shared_path points at the directory used by fit-projection, "
+                f"or run `python main.py fit-projection --collection {name} --dim {projection_dim}`."
             )
-        return cls._instance
+        if projection_dim > 0:
+            projection = Projection.load(Projection.path_for(name, projection_dim))
+            projected_name = f"{name}_pca{projection_dim}"
+            stored = self.stored_fingerprint(projected_name)
+            if stored != projection.fingerprint:
+                raise ValueError(
+                    f"Projection file for {name} (fingerprint {projection.fingerprint}) does not match the vectors "
+                    f"in {projected_name} (fingerprint {stored}). Refusing to query with a different projection."
+                )
+            raw = self.open_raw_collection(projected_name, name, metadata={FINGERPRINT_KEY: stored})
+            collection = ProjectedCollection(name, raw, projection, vectors)
+        else:
+            collection = self.open_raw_collection(name)
+        return CachedCollection(name, collection, self.query_cache, self._generations)
+
+    def invalidate_cache(self, name: str):
+        """绕过缓存层直接写入底层 collection 后 (例如 fit-projection)，递增版本号使查询缓存失效"""
+        self.client  # 确保已连接
+        self._generations.bump(name)
+
+    def open_raw_collection(self, collection_name: str, kind: str = None, metadata: dict = None):
+        """
+        打开底层 collection (不做投影、不带缓存)。
+        num_shards > 1 时返回分片 collection：数据按 id 哈希分布到 <collection_name>_shard_<i>，
+        每个分片拥有独立的 HNSW 索引，写入与查询在线程池中并行执行。
+        :param kind: papers / images，决定使用哪组 HNSW 参数，默认与 collection_name 相同
+        :param metadata: 额外的 collection metadata (例如投影指纹)，仅在创建时写入
+        """
+        hnsw = Database.hnsw_metadata(Config.get(HNSW_KEYS[kind or collection_name]))
+        metadata = {**(hnsw or {}), **(metadata or {})} or None
+        num_shards = Config.get("num_shards")
+        if num_shards <= 1:
+            return self.client.get_or_create_collection(name=collection_name, metadata=metadata)
+        shards = [
+            self.client.get_or_create_collection(name=f"{collection_name}_shard_{i}", metadata=metadata)
+            for i in range(num_shards)
+        ]
+        return ShardedCollection(collection_name, shards)
+
+    def drop_raw_collection(self, collection_name: str):
+        """删除底层 collection (含全部分片)，不存在时忽略"""
+        names = [collection_name] + [f"{collection_name}_shard_{i}" for i in range(Config.get("num_shards"))]
+        existing = {c.name for c in self.client.list_collections()}
+        for name in names:
+            if name in existing:
+                self.client.delete_collection(name)
+
+    def stored_fingerprint(self, collection_name: str):
+        """
+        投影后的 collection 创建时记录的投影指纹，collection 不存在时返回 None。
+        直接读取已有 collection 的 metadata：get_or_create 会用传入的 metadata 覆盖原值，不能用于校验。
+        分片时读取第一个分片 (各分片创建时写入相同的 metadata)。
+        """
+        first = collection_name if Config.get("num_shards") <= 1 else f"{collection_name}_shard_0"
+        existing = {c.name: c for c in self.client.list_collections()}
+        if first not in existing:
+            return None
+        return (existing[first].metadata or {}).get(FINGERPRINT_KEY)
+
+    @staticmethod
+    def hnsw_metadata(params: dict):
+        """
+        配置中的 HNSW 参数 -> Chroma collection metadata。
+        支持的 key: space (l2 / cosine / ip), M, construction_ef, search_ef；未配置的沿用 Chroma 默认值。
+        """
+        allowed = ("space", "M", "construction_ef", "search_ef")
+        unknown = [k for k in params if k not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown HNSW parameters: {unknown} (expected {list(allowed)})")
+        return {f"hnsw:{k}": v for k, v in params.items()} or None
 
     def get_paper_collection(self):
+        if self.paper_collection is None:
+            self.client  # 确保已连接
+            self.paper_collection = self._open_collection("papers")
         return self.paper_collection
 
     def get_image_collection(self):
+        if self.image_collection is None:
+            self.client  # 确保已连接
+            self.image_collection = self._open_collection("images")
         return self.image_collection
 
+    def describe(self) -> str:
+        """当前数据库位置 (用于界面展示)"""
+        if self.mode == "server":
+            return f"http://{Config.get('server_host')}:{Config.get('server_port')}"
+        return Config.get("db_path")
+
+    @staticmethod
+    def serve(host: str = None, port: int = None):
+        """
+        以服务模式运行：当前进程独占 db_path 下的数据库，对外提供 Chroma HTTP API。
+        其他进程设置 db_mode=server 后即可并发读写 (ingest 与搜索可同时进行)。
+        """
+        import uvicorn
+
+        host = host or Config.get("server_host")
+        port = port or Config.get("server_port")
+        db_path = Config.get("db_path")
+        os.makedirs(db_path, exist_ok=True)
+
+        # chromadb.app 在导入时根据环境变量构造 Settings
+        os.environ["IS_PERSISTENT"] = "TRUE"
+        os.environ["PERSIST_DIRECTORY"] = db_path
+        print(f"Serving database {db_path} on http://{host}:{port}")
+        uvicorn.run("chromadb.app:app", host=host, port=port, log_level="warning", timeout_keep_alive=30)
+
 # 全局数据库实例
 db = Database()
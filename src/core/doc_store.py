@@ -0,0 +1,129 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, List
+from src.core.config import Config
+
+# zlib 压缩级别：6 为速度与压缩率的折中
+COMPRESS_LEVEL = 6
+
+
+class DocStore:
+    """
+    chunk 原文的旁路存储 (SQLite，位于 shared_path 或 db_path 下的 docstore.sqlite)。
+    - 按内容寻址：相同文本只存一份 (sha256 -> zlib 压缩数据)
+    - chunk id -> 内容哈希，支持按 id 随机读取
+    向量库中只保存 embedding 与 metadata，查询不再返回整段原文；
+    界面上真正渲染的结果再按 id 读取摘要片段或全文。
+    服务模式下必须显式配置 shared_path 指向索引服务的数据目录 (各客户端共用同一个文件)，
+    否则不启用，原文仍写入服务端的向量库，避免每个客户端各自存一份互不可见的原文。
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(DocStore, cls).__new__(cls)
+            # 延迟连接，与 Database 一致
+            cls._instance._conn = None
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+
+    @property
+    def enabled(self) -> bool:
+        return Config.get("doc_store") and Config.shared_dir() is not None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(Config.shared_dir(), "docstore.sqlite")
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL: CLI 导入与界面查询可以在不同进程中同时读写
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS blobs (hash BLOB PRIMARY KEY, data BLOB NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS refs (id TEXT PRIMARY KEY, hash BLOB NOT NULL)")
+            # 删除 / 覆盖时按哈希判断内容是否还被引用
+            conn.execute("CREATE INDEX IF NOT EXISTS refs_hash ON refs (hash)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _referenced_hashes(conn, ids: List[str]) -> List[bytes]:
+        placeholders = ",".join("?" * len(ids))
+        rows = conn.execute(f"SELECT DISTINCT hash FROM refs WHERE id IN ({placeholders})", list(ids)).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _drop_orphans(conn, hashes: List[bytes]):
+        """只检查给定的哈希，删除其中不再被任何 id 引用的内容 (无需扫描整张表)"""
+        conn.executemany(
+            "DELETE FROM blobs WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM refs WHERE refs.hash = blobs.hash)",
+            [(h,) for h in hashes]
+        )
+
+    def put_many(self, ids: List[str], texts: List[str]):
+        """写入或覆盖原文；被覆盖的旧内容如果不再被引用会一并删除"""
+        if not ids:
+            return
+        blobs = {}
+        refs = []
+        for record_id, text in zip(ids, texts):
+            data = text.encode("utf-8")
+            digest = hashlib.sha256(data).digest()
+            if digest not in blobs:
+                blobs[digest] = zlib.compress(data, COMPRESS_LEVEL)
+            refs.append((record_id, digest))
+        with self._lock:
+            conn = self.conn
+            previous = self._referenced_hashes(conn, ids)
+            conn.executemany("INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)", blobs.items())
+            conn.executemany("INSERT OR REPLACE INTO refs (id, hash) VALUES (?, ?)", refs)
+            self._drop_orphans(conn, [h for h in previous if h not in blobs])
+            conn.commit()
+
+    def get_many(self, ids: List[str], max_chars: int = None) -> Dict[str, str]:
+        """
+        按 id 读取原文，返回 {id: text}，不存在的 id 不出现在结果中。
+        :param max_chars: 只需要片段时只解压开头部分
+        """
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT refs.id, blobs.data FROM refs JOIN blobs ON refs.hash = blobs.hash "
+                f"WHERE refs.id IN ({placeholders})",
+                list(ids)
+            ).fetchall()
+
+        texts = {}
+        for record_id, data in rows:
+            if max_chars is None:
+                texts[record_id] = zlib.decompress(data).decode("utf-8")
+            else:
+                # UTF-8 单字符最多 4 字节；截断处可能切开一个字符，忽略即可
+                head = zlib.decompressobj().decompress(data, max_chars * 4)
+                texts[record_id] = head.decode("utf-8", errors="ignore")[:max_chars]
+        return texts
+
+    def delete_many(self, ids: List[str]):
+        if not ids:
+            return
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            conn = self.conn
+            hashes = self._referenced_hashes(conn, ids)
+            conn.execute(f"DELETE FROM refs WHERE id IN ({placeholders})", list(ids))
+            # 清理不再被引用的内容
+            self._drop_orphans(conn, hashes)
+            conn.commit()
+
+
+# 全局文档存储实例
+doc_store = DocStore()
@@ -0,0 +1,112 @@
+import time
+from typing import Callable, List
+from src.core.config import Config
+
+
+def plan_batches(lengths: List[int], token_budget: int, max_batch_size: int) -> List[List[int]]:
+    """
+    按 token 长度从长到短排序后贪心切分批次。
+    每批补齐后的 token 数 (批内最大长度 x 条数) 不超过 token_budget，
+    长文本自动小批、短文本自动大批；长度不到批内最长一半的文本另起一批，减少 padding 浪费。
+    返回每批的原始下标。
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    current = []
+    for i in order:
+        # 已按长度降序，批内最大长度就是第一条的长度
+        longest = lengths[current[0]] if current else lengths[i]
+        if current and (longest * (len(current) + 1) > token_budget
+                        or len(current) >= max_batch_size
+                        or lengths[i] * 2 < longest):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def encode_scheduled(texts: List[str], token_lengths: Callable[[List[str]], List[int]],
+                     encode_batch: Callable[[List[str]], list],
+                     token_budget: int = None, max_batch_size: int = None) -> list:
+    """
+    按长度分桶批量编码，返回结果与输入顺序一致。
+    :param token_lengths: 计算每条文本 token 数 (截断后) 的函数
+    :param encode_batch: 编码一批文本的函数，返回等长的 embedding 列表
+    """
+    if not texts:
+        return []
+    token_budget = token_budget or Config.get("embed_token_budget")
+    max_batch_size = max_batch_size or Config.get("embed_max_batch_size")
+
+    results = [None] * len(texts)
+    for batch in plan_batches(token_lengths(texts), token_budget, max_batch_size):
+        for i, emb in zip(batch, encode_batch([texts[i] for i in batch])):
+            results[i] = emb
+    return results
+
+
+def padding_efficiency(lengths: List[int], batches: List[List[int]]) -> float:
+    """有效 token / 补齐后 token，越接近 1 浪费越少"""
+    real = sum(lengths)
+    padded = sum(max(lengths[i] for i in b) * len(b) for b in batches)
+    return real / padded if padded else 1.0
+
+
+class EmbedBenchmark:
+    """
+    在真实论文 chunk 上对比固定批大小 (SentenceTransformer 默认 32) 与按长度分桶的吞吐量。
+    """
+
+    @staticmethod
+    def run(pdf_paths: List[str], fixed_batch_size: int = 32, repeats: int = 1):
+        from src.core.model_loader import ModelLoader, text_token_lengths, encode_text_batch
+        from src.core.processor import Processor
+
+        texts = []
+        for path in pdf_paths:
+            pages = Processor.extract_text_with_page(path)
+            texts.extend(c["text"] for c in Processor.chunk_text(pages))
+            # 与 add_paper 一致：摘要作为一条长文本混在短 chunk 中
+            texts.append(Processor.extract_summary_candidate(pages))
+        if not texts:
+            print("No text extracted.")
+            return {}
+
+        model = ModelLoader.get_text_model()
+        lengths = text_token_lengths(texts)
+        token_budget = Config.get("embed_token_budget")
+        max_batch_size = Config.get("embed_max_batch_size")
+        # SentenceTransformer.encode 内部按字符长度排序后按固定条数切批
+        char_order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        fixed_batches = [char_order[i:i + fixed_batch_size] for i in range(0, len(texts), fixed_batch_size)]
+        bucketed_batches = plan_batches(lengths, token_budget, max_batch_size)
+
+        def timed(fn):
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        # 基准: SentenceTransformer 默认行为
+        fixed_time = timed(lambda: model.encode(texts, batch_size=fixed_batch_size, normalize_embeddings=True))
+        bucketed_time = timed(lambda: encode_scheduled(texts, text_token_lengths, encode_text_batch))
+
+        result = {
+            "texts": len(texts),
+            "fixed_texts_per_s": len(texts) / fixed_time,
+            "bucketed_texts_per_s": len(texts) / bucketed_time,
+            "fixed_padding_efficiency": padding_efficiency(lengths, fixed_batches),
+            "bucketed_padding_efficiency": padding_efficiency(lengths, bucketed_batches),
+            "bucketed_batches": len(bucketed_batches),
+        }
+        print(f"Chunks: {len(texts)} (tokens min/max: {min(lengths)}/{max(lengths)})")
+        print(f"Fixed batch {fixed_batch_size:<4}: {result['fixed_texts_per_s']:8.1f} texts/s, "
+              f"padding efficiency {result['fixed_padding_efficiency']:.2%}")
+        print(f"Token budget {token_budget:<5}: {result['bucketed_texts_per_s']:8.1f} texts/s, "
+              f"padding efficiency {result['bucketed_padding_efficiency']:.2%} in {len(bucketed_batches)} batches")
+        print(f"Speedup: {fixed_time / bucketed_time:.2f}x")
+        return result
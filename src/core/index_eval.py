@@ -0,0 +1,399 @@
+import itertools
+import time
+import uuid
+import chromadb
+import numpy as np
+from typing import List
+from src.core.database import Database, db
+from src.core.sharding import ShardedCollection
+from src.core.projection import Projection, FullVectorStore, FINGERPRINT_KEY
+from src.core.doc_store import doc_store
+
+# 读取线上 collection embedding 时每页条数
+PAGE_SIZE = 5000
+
+
+def load_embeddings(collection, limit: int = None) -> np.ndarray:
+    """分页读取 collection 中的全部 (或前 limit 条) embedding"""
+    total = collection.count() if limit is None else min(limit, collection.count())
+    pages = []
+    offset = 0
+    while offset < total:
+        page = collection.get(include=["embeddings"], limit=min(PAGE_SIZE, total - offset), offset=offset)
+        if not page["ids"]:
+            break
+        pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    if not pages:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(pages)
+
+
+def corpus_and_queries(collection_name: str, synthetic: int, dim: int, num_queries: int, seed: int):
+    """
+    返回 (语料向量, 查询向量, 描述)。
+    synthetic > 0 时使用合成向量，否则读取线上 collection；查询为语料向量加少量噪声，避免每个查询都精确命中自身。
+    """
+    if synthetic:
+        data = synthetic_embeddings(synthetic, dim, seed)
+        source = f"synthetic ({synthetic} x {dim})"
+    else:
+        collection = db.get_paper_collection() if collection_name == "papers" else db.get_image_collection()
+        data = load_embeddings(collection)
+        source = f"{collection_name} ({data.shape[0]} x {data.shape[1] if data.size else 0})"
+    if data.shape[0] == 0:
+        return data, data, source
+
+    rng = np.random.default_rng(seed)
+    query_idx = rng.choice(data.shape[0], size=min(num_queries, data.shape[0]), replace=False)
+    queries = data[query_idx] + 0.05 * rng.standard_normal((len(query_idx), data.shape[1])).astype(np.float32)
+    return data, queries, source
+
+
+def full_embeddings(collection_name: str) -> np.ndarray:
+    """collection 的全部全维度 embedding：启用降维时读取旁路文件，否则读取全维度 collection"""
+    vectors = FullVectorStore(collection_name)
+    if not vectors.active_dim:
+        return load_embeddings(db.open_raw_collection(collection_name))
+    pages = [page for _, page in vectors.iter_pages(PAGE_SIZE)]
+    return np.concatenate(pages) if pages else np.empty((0, 0), dtype=np.float32)
+
+
+def _copy_documents(collection_name: str, ids: List[str], documents):
+    """
+    Chroma 不接受部分为 None 的 documents：启用 DocStore 时把其余原文也转存过去，返回应写入 Chroma 的 documents
+    """
+    if documents is not None and any(d is None for d in documents):
+        if collection_name == "papers" and doc_store.enabled:
+            doc_store.put_many([i for i, d in zip(ids, documents) if d is not None],
+                               [d for d in documents if d is not None])
+        return None
+    return documents
+
+
+def sample_embeddings(collection, n: int) -> np.ndarray:
+    """
+    从 collection 中抽取约 n 条 embedding 用于拟合。
+    在整个 collection 上等间隔读取若干小页，避免只取到最早入库的几篇论文。
+    """
+    total = collection.count()
+    if total <= n:
+        return load_embeddings(collection)
+    page = min(1000, n)
+    starts = np.linspace(0, total - page, num=-(-n // page)).astype(int)
+    pages = []
+    for start in starts:
+        got = collection.get(include=["embeddings"], limit=page, offset=int(start))
+        pages.append(np.asarray(got["embeddings"], dtype=np.float32))
+    return np.concatenate(pages)[:n]
+
+
+def synthetic_embeddings(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """归一化的随机向量 (簇状分布，比纯均匀分布更接近真实 embedding)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 100), dim))
+    data = centers[rng.integers(0, len(centers), n)] + 0.3 * rng.standard_normal((n, dim))
+    return (data / np.linalg.norm(data, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_top_k(data: np.ndarray, queries: np.ndarray, k: int, space: str = "l2") -> np.ndarray:
+    """暴力搜索的精确 top-k 下标，作为 recall 的基准 (按查询分块计算，控制距离矩阵的内存)"""
+    block = max(1, 2 ** 25 // max(1, data.shape[0]))
+    return np.concatenate([
+        _exact_top_k_block(data, queries[start:start + block], k, space)
+        for start in range(0, len(queries), block)
+    ]) if len(queries) else np.empty((0, min(k, data.shape[0])), dtype=np.int64)
+
+
+def _exact_top_k_block(data: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    if space == "l2":
+        scores = (queries ** 2).sum(1, keepdims=True) - 2 * queries @ data.T + (data ** 2).sum(1)
+    elif space == "ip":
+        scores = 1 - queries @ data.T
+    elif space == "cosine":
+        q = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        d = data / np.linalg.norm(data, axis=1, keepdims=True)
+        scores = 1 - q @ d.T
+    else:
+        raise ValueError(f"Unknown space: {space}")
+    k = min(k, data.shape[0])
+    top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def recall_at_k(approx: List[List[int]], exact: np.ndarray) -> float:
+    """每个查询的 |近似结果 ∩ 精确结果| / k 的平均值"""
+    hits = [len(set(a) & set(e.tolist())) / len(e) for a, e in zip(approx, exact)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def _bulk_add(client, collection, ids: List[str], data: np.ndarray):
+    batch_size = getattr(client, "max_batch_size", PAGE_SIZE)
+    for start in range(0, len(ids), batch_size):
+        collection.add(ids=ids[start:start + batch_size], embeddings=data[start:start + batch_size].tolist())
+
+
+def _timed_queries(collection, queries: np.ndarray, k: int):
+    """逐条查询，返回 (每个查询的结果下标, 每个查询的耗时毫秒)"""
+    approx, latencies = [], []
+    for q in queries:
+        query_start = time.perf_counter()
+        res = collection.query(query_embeddings=[q.tolist()], n_results=k, include=["distances"])
+        latencies.append((time.perf_counter() - query_start) * 1000)
+        approx.append([int(i) for i in res["ids"][0]])
+    return approx, latencies
+
+
+class HnswSweep:
+    """
+    HNSW 参数扫描：对每组 (space, M, construction_ef, search_ef) 在内存中的临时 collection 上建索引，
+    与暴力搜索对比 recall@k，并统计单条查询的 p50 / p99 延迟。不会修改线上数据库。
+    """
+
+    @staticmethod
+    def run(collection_name: str = "papers", synthetic: int = 0, dim: int = 384,
+            num_queries: int = 200, k: int = 10,
+            spaces: List[str] = None, ms: List[int] = None,
+            construction_efs: List[int] = None, search_efs: List[int] = None,
+            seed: int = 0):
+        data, queries, source = corpus_and_queries(collection_name, synthetic, dim, num_queries, seed)
+        if data.shape[0] == 0:
+            print("No embeddings to evaluate.")
+            return []
+
+        print(f"HNSW sweep on {source}, {len(queries)} queries, recall@{k}")
+        header = f"{'space':<7}{'M':>5}{'c_ef':>7}{'s_ef':>7}{'recall':>9}{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}"
+        print(header)
+        print("-" * len(header))
+
+        client = chromadb.EphemeralClient()
+        ids = [str(i) for i in range(data.shape[0])]
+        results = []
+        exact_cache = {}
+        grid = itertools.product(spaces or ["l2"], ms or [16], construction_efs or [100], search_efs or [10])
+        for space, m, construction_ef, search_ef in grid:
+            if space not in exact_cache:
+                exact_cache[space] = exact_top_k(data, queries, k, space)
+
+            name = f"sweep_{uuid.uuid4().hex[:8]}"
+            collection = client.create_collection(
+                name=name,
+                metadata=Database.hnsw_metadata(
+                    {"space": space, "M": m, "construction_ef": construction_ef, "search_ef": search_ef}
+                )
+            )
+            build_start = time.perf_counter()
+            _bulk_add(client, collection, ids, data)
+            build_time = time.perf_counter() - build_start
+
+            approx, latencies = _timed_queries(collection, queries, k)
+            client.delete_collection(name)
+
+            row = {
+                "space": space, "M": m, "construction_ef": construction_ef, "search_ef": search_ef,
+                "recall": recall_at_k(approx, exact_cache[space]),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "build_s": build_time,
+            }
+            results.append(row)
+            print(f"{space:<7}{m:>5}{construction_ef:>7}{search_ef:>7}{row['recall']:>9.4f}"
+                  f"{row['p50_ms']:>9.2f}{row['p99_ms']:>9.2f}{build_time:>9.2f}")
+        return results
+
+
+class ShardBenchmark:
+    """
+    分片扩展性测试：对每个分片数在内存中的临时 collection 上写入同一份语料，
+    统计写入耗时、p50 / p99 查询延迟、recall@k，以及与单分片结果的一致率。
+    """
+
+    @staticmethod
+    def run(shard_counts: List[int], collection_name: str = "papers", synthetic: int = 0, dim: int = 384,
+            num_queries: int = 200, k: int = 10, seed: int = 0):
+        data, queries, source = corpus_and_queries(collection_name, synthetic, dim, num_queries, seed)
+        if data.shape[0] == 0:
+            print("No embeddings to evaluate.")
+            return []
+
+        print(f"Shard benchmark on {source}, {len(queries)} queries, top-{k}")
+        header = f"{'shards':>7}{'ingest s':>10}{'p50 ms':>9}{'p99 ms':>9}{'recall':>9}{'match 1-shard':>15}"
+        print(header)
+        print("-" * len(header))
+
+        client = chromadb.EphemeralClient()
+        ids = [str(i) for i in range(data.shape[0])]
+        exact = exact_top_k(data, queries, k)
+        baseline = None
+        results = []
+        # 单分片结果作为基准，始终最先测
+        for num_shards in sorted(set([1] + list(shard_counts))):
+            prefix = f"bench_{uuid.uuid4().hex[:8]}"
+            names = [f"{prefix}_{i}" for i in range(num_shards)]
+            shards = [client.create_collection(name=n) for n in names]
+            # 单分片也经过 ShardedCollection，各分片数走同一条写入 / 查询路径 (线程池、结果合并)，对比才公平
+            collection = ShardedCollection(prefix, shards)
+
+            ingest_start = time.perf_counter()
+            _bulk_add(client, collection, ids, data)
+            ingest_time = time.perf_counter() - ingest_start
+
+            approx, latencies = _timed_queries(collection, queries, k)
+            for n in names:
+                client.delete_collection(n)
+
+            if baseline is None:
+                baseline = approx
+            row = {
+                "shards": num_shards,
+                "ingest_s": ingest_time,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "recall": recall_at_k(approx, exact),
+                "match_unsharded": recall_at_k(approx, np.asarray(baseline)),
+            }
+            results.append(row)
+            print(f"{num_shards:>7}{ingest_time:>10.2f}{row['p50_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+                  f"{row['recall']:>9.4f}{row['match_unsharded']:>15.4f}")
+        return results
+
+
+class ProjectionEval:
+    """
+    降维评估：在全维度 collection 的 embedding 上，对每个候选维度拟合 PCA，
+    比较投影空间与全维度空间的暴力 top-k，报告 recall@k。
+    两边都用精确搜索，因此结果只反映降维本身的损失，与 HNSW 参数无关。
+    """
+
+    @staticmethod
+    def run(collection_name: str, dims: List[int], num_queries: int = 200, k: int = 10,
+            sample: int = 20000, seed: int = 0):
+        data = full_embeddings(collection_name)
+        if data.shape[0] == 0:
+            print("No embeddings to evaluate.")
+            return []
+
+        rng = np.random.default_rng(seed)
+        query_idx = rng.choice(data.shape[0], size=min(num_queries, data.shape[0]), replace=False)
+        queries = data[query_idx] + 0.05 * rng.standard_normal((len(query_idx), data.shape[1])).astype(np.float32)
+        fit_sample = data[rng.choice(data.shape[0], size=min(sample, data.shape[0]), replace=False)]
+        exact = exact_top_k(data, queries, k)
+
+        print(f"Projection eval on {collection_name} ({data.shape[0]} x {data.shape[1]}), "
+              f"{len(queries)} queries, recall@{k}, fitted on {len(fit_sample)} vectors")
+        header = f"{'dim':>6}{'variance':>10}{'recall':>9}{'bytes/vec':>11}"
+        print(header)
+        print("-" * len(header))
+        print(f"{data.shape[1]:>6}{1.0:>10.3f}{1.0:>9.4f}{data.shape[1] * 4:>11}")
+
+        results = []
+        for dim in sorted(dims, reverse=True):
+            if dim >= data.shape[1] or dim > len(fit_sample):
+                print(f"{dim:>6}  skipped (must be < {data.shape[1]} and <= sample size)")
+                continue
+            projection = Projection.fit(fit_sample, dim)
+            approx = exact_top_k(projection.transform(data), projection.transform(queries), k)
+            row = {"dim": dim, "explained_variance": projection.explained_variance,
+                   "recall": recall_at_k(approx.tolist(), exact), "bytes_per_vector": dim * 4}
+            results.append(row)
+            print(f"{dim:>6}{row['explained_variance']:>10.3f}{row['recall']:>9.4f}{row['bytes_per_vector']:>11}")
+        return results
+
+    @staticmethod
+    def fit(collection_name: str, dim: int, sample: int = 20000):
+        """
+        在全维度 embedding 的样本上拟合投影并保存，然后把全部向量投影后写入新的 <name>_pca<dim>。
+        全维度向量转存到 shared_path 下的旁路文件 (不建索引)，之后删除原来的 collection，
+        HNSW 中只保留投影后的向量。已经降维时从旁路文件重新拟合到另一个维度。
+        运行期间不要同时导入数据；完成后在配置中设置 <paper|image>_projection_dim = dim。
+        """
+        vectors = FullVectorStore(collection_name)
+        active_dim = vectors.active_dim
+        if active_dim == dim:
+            print(f"{collection_name} is already projected to {dim} dims. "
+                  f"Run drop-projection first to refit at the same dimension.")
+            return None
+        source_name = f"{collection_name}_pca{active_dim}" if active_dim else collection_name
+        source = db.open_raw_collection(source_name, collection_name)
+        fit_sample = vectors.sample(sample) if active_dim else sample_embeddings(source, sample)
+        if fit_sample.shape[0] == 0:
+            print("No embeddings to fit.")
+            return None
+        projection = Projection.fit(fit_sample, dim)
+        path = Projection.path_for(collection_name, dim)
+        projection.save(path)
+        print(f"Fitted {fit_sample.shape[1]} -> {dim} projection on {len(fit_sample)} vectors "
+              f"(explained variance {projection.explained_variance:.3f}), saved to {path}")
+
+        # 目标 collection 重新创建，并记录投影指纹，客户端打开时据此校验投影文件
+        target_name = f"{collection_name}_pca{dim}"
+        db.drop_raw_collection(target_name)
+        target = db.open_raw_collection(target_name, collection_name,
+                                        metadata={FINGERPRINT_KEY: projection.fingerprint})
+        include = ["metadatas", "documents"] if active_dim else ["embeddings", "metadatas", "documents"]
+        total = source.count()
+        offset = 0
+        while offset < total:
+            page = source.get(include=include, limit=PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            if active_dim:
+                stored = vectors.get_many(page["ids"])
+                embeddings = np.stack([stored[i] for i in page["ids"]])
+            else:
+                embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+                vectors.put_many(page["ids"], embeddings)
+            target.upsert(
+                ids=page["ids"],
+                embeddings=projection.transform(embeddings).tolist(),
+                metadatas=page["metadatas"],
+                documents=_copy_documents(collection_name, page["ids"], page["documents"])
+            )
+            offset += len(page["ids"])
+            print(f" -> {offset}/{total}", end="\r", flush=True)
+        print(f" -> Wrote {offset} projected vectors to {target_name}")
+
+        vectors.set_active_dim(dim)
+        db.drop_raw_collection(source_name)
+        print(f" -> Dropped {source_name}; full-dimension vectors kept in {vectors.path}")
+        # 写入绕过了 CachedCollection，其他进程需要丢弃旧的缓存结果
+        db.invalidate_cache(collection_name)
+        print(f"Set {collection_name[:-1]}_projection_dim={dim} (e.g. LMA_{collection_name[:-1].upper()}_PROJECTION_DIM={dim}) to use it.")
+        return projection
+
+    @staticmethod
+    def drop(collection_name: str):
+        """
+        关闭降维：把旁路文件中的全维度向量连同 metadata / documents 写回 <name>，
+        然后删除 <name>_pca<dim> 与旁路文件。完成后把 <paper|image>_projection_dim 设回 0。
+        """
+        vectors = FullVectorStore(collection_name)
+        active_dim = vectors.active_dim
+        if not active_dim:
+            print(f"{collection_name} is not projected.")
+            return
+        source_name = f"{collection_name}_pca{active_dim}"
+        source = db.open_raw_collection(source_name, collection_name)
+        target = db.open_raw_collection(collection_name)
+        total = source.count()
+        offset = 0
+        while offset < total:
+            page = source.get(include=["metadatas", "documents"], limit=PAGE_SIZE, offset=offset)
+            if not page["ids"]:
+                break
+            stored = vectors.get_many(page["ids"])
+            target.upsert(
+                ids=page["ids"],
+                embeddings=[stored[i].tolist() for i in page["ids"]],
+                metadatas=page["metadatas"],
+                documents=_copy_documents(collection_name, page["ids"], page["documents"])
+            )
+            offset += len(page["ids"])
+            print(f" -> {offset}/{total}", end="\r", flush=True)
+        print(f" -> Restored {offset} full-dimension vectors to {collection_name}")
+
+        db.drop_raw_collection(source_name)
+        vectors.drop()
+        db.invalidate_cache(collection_name)
+        print(f"Set {collection_name[:-1]}_projection_dim=0 to use the full-dimension collection.")
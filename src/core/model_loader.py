@@ -1,6 +1,41 @@
 from sentence_transformers import SentenceTransformer
 from transformers import CLIPProcessor, CLIPModel, CLIPTokenizer, BlipProcessor, BlipForQuestionAnswering
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
 import torch
+from src.core.config import Config
+from src.core.embed_scheduler import encode_scheduled
+
+# low_cpu_mem_usage: 跳过随机初始化 (先在 meta 设备上创建模型再填入权重)，加快加载并降低加载期间的峰值内存
+PRETRAINED_KWARGS = {"low_cpu_mem_usage": True}
+
+
+def map_weights(module: torch.nn.Module, key: str) -> torch.nn.Module:
+    """
+    mmap_weights 开启时，把模型参数换成 mmap 映射的文件 (只读页由操作系统页缓存在多个进程间共享，
+    UI、CLI 导入、索引服务同时加载同一模型时物理内存中只有一份权重)。
+    第一次调用时把 state_dict 存为 <weights_cache_dir>/<key>.pt，之后从该文件映射。
+    from_pretrained 读入的副本在替换后释放，因此加载期间的峰值内存不变，常驻部分由进程私有变为共享。
+    需要 torch >= 2.1 (torch.load(mmap=True) 与 load_state_dict(assign=True))，不满足时保留原权重。
+    """
+    if not Config.get("mmap_weights"):
+        return module
+    cache_dir = Config.get("weights_cache_dir")
+    path = os.path.join(cache_dir, f"{key}.pt")
+    try:
+        if not os.path.exists(path):
+            os.makedirs(cache_dir, exist_ok=True)
+            # 写临时文件再替换：多个进程同时首次加载时不会读到写了一半的文件
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            torch.save(module.state_dict(), tmp_path)
+            os.replace(tmp_path, path)
+        state = torch.load(path, mmap=True, weights_only=True, map_location="cpu")
+        module.load_state_dict(state, assign=True)
+    except (TypeError, RuntimeError) as e:
+        print(f"Warning: memory-mapped weights unavailable for {key} ({e}); using in-process weights")
+    return module
 
 class ModelLoader:
     _text_model = None
@@ -10,42 +45,116 @@ class ModelLoader:
     _blip_model = None
     _blip_processor = None
 
+    # 每个模型一把锁：预加载线程与请求线程同时触发时只加载一次
+    _locks = {"text": threading.Lock(), "clip": threading.Lock(), "blip": threading.Lock()}
+    # 各模型加载耗时 (秒)
+    load_times = {}
+
     @classmethod
     def get_text_model(cls):
         """Lazy load SentenceTransformer model"""
         if cls._text_model is None:
-            print("Loading Text Embedding Model (all-MiniLM-L6-v2)...")
-            cls._text_model = SentenceTransformer('all-MiniLM-L6-v2')
+            with cls._locks["text"]:
+                if cls._text_model is None:
+                    print("Loading Text Embedding Model (all-MiniLM-L6-v2)...")
+                    start = time.perf_counter()
+                    cls._text_model = map_weights(SentenceTransformer('all-MiniLM-L6-v2'), "all-MiniLM-L6-v2")
+                    cls._record_load_time("text", start)
         return cls._text_model
 
     @classmethod
     def get_clip_components(cls):
         """Lazy load CLIP model and processor"""
         if cls._clip_model is None:
-            print("Loading CLIP Model (openai/clip-vit-base-patch32)...")
-            model_name = "openai/clip-vit-base-patch32"
-            cls._clip_model = CLIPModel.from_pretrained(model_name)
-            cls._clip_processor = CLIPProcessor.from_pretrained(model_name)
-            cls._clip_tokenizer = CLIPTokenizer.from_pretrained(model_name)
+            with cls._locks["clip"]:
+                if cls._clip_model is None:
+                    print("Loading CLIP Model (openai/clip-vit-base-patch32)...")
+                    start = time.perf_counter()
+                    model_name = "openai/clip-vit-base-patch32"
+                    # 模型权重、processor、tokenizer 三个文件互不依赖，并行加载
+                    with ThreadPoolExecutor(max_workers=3) as executor:
+                        model = executor.submit(CLIPModel.from_pretrained, model_name, **PRETRAINED_KWARGS)
+                        processor = executor.submit(CLIPProcessor.from_pretrained, model_name)
+                        tokenizer = executor.submit(CLIPTokenizer.from_pretrained, model_name)
+                        cls._clip_processor = processor.result()
+                        cls._clip_tokenizer = tokenizer.result()
+                        cls._clip_model = map_weights(model.result(), "clip-vit-base-patch32")
+                    cls._record_load_time("clip", start)
         return cls._clip_model, cls._clip_processor, cls._clip_tokenizer
 
     @classmethod
     def get_blip_components(cls):
         """Lazy load BLIP VQA model"""
         if cls._blip_model is None:
-            print("Loading BLIP Model (Salesforce/blip-vqa-base)...")
-            model_name = "Salesforce/blip-vqa-base"
-            cls._blip_processor = BlipProcessor.from_pretrained(model_name)
-            cls._blip_model = BlipForQuestionAnswering.from_pretrained(model_name)
+            with cls._locks["blip"]:
+                if cls._blip_model is None:
+                    print("Loading BLIP Model (Salesforce/blip-vqa-base)...")
+                    start = time.perf_counter()
+                    model_name = "Salesforce/blip-vqa-base"
+                    with ThreadPoolExecutor(max_workers=2) as executor:
+                        processor = executor.submit(BlipProcessor.from_pretrained, model_name)
+                        model = executor.submit(BlipForQuestionAnswering.from_pretrained, model_name, **PRETRAINED_KWARGS)
+                        cls._blip_processor = processor.result()
+                        cls._blip_model = map_weights(model.result(), "blip-vqa-base")
+                    cls._record_load_time("blip", start)
         return cls._blip_model, cls._blip_processor
 
+    @classmethod
+    def preload(cls, models=None):
+        """
+        启动时并行加载模型，避免每个功能的第一个用户等待冷启动。
+        每个进程各自加载；开启 mmap_weights 后各进程的权重映射同一个文件，物理内存只占一份 (见 map_weights)。
+        :param models: 例如 ["text", "clip", "blip"]，默认读取配置 preload_models
+        """
+        models = Config.get("preload_models") if models is None else models
+        loaders = {
+            "text": cls.get_text_model,
+            "clip": cls.get_clip_components,
+            "blip": cls.get_blip_components,
+        }
+        unknown = [m for m in models if m not in loaders]
+        if unknown:
+            raise ValueError(f"Unknown models to preload: {unknown} (expected {list(loaders)})")
+        if not models:
+            return
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(models)) as executor:
+            for future in [executor.submit(loaders[m]) for m in models]:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        budget = Config.get("model_load_budget_s")
+        print(f"Preloaded {', '.join(models)} in {elapsed:.2f}s")
+        if budget and elapsed > budget:
+            print(f"Warning: model cold start {elapsed:.2f}s exceeds budget {budget:.2f}s")
+
+    @classmethod
+    def _record_load_time(cls, name, start):
+        cls.load_times[name] = time.perf_counter() - start
+        print(f" -> {name} model loaded in {cls.load_times[name]:.2f}s")
+
 # 便捷获取函数
 def get_text_embedding(text):
+    # 批量输入按 token 长度分桶，批大小由 token 预算决定 (见 embed_scheduler)
+    if isinstance(text, (list, tuple)):
+        return encode_scheduled(list(text), text_token_lengths, encode_text_batch)
     model = ModelLoader.get_text_model()
     # SentenceTransformers 返回的是 numpy array, 需要转 list 存入 ChromaDB
     # [FIX] 强制归一化，配合 ChromaDB 默认的 L2 距离使用，等效于 Cosine 相似度
     return model.encode(text, normalize_embeddings=True).tolist()
 
+def text_token_lengths(texts):
+    """每条文本截断后的 token 数 (MiniLM)"""
+    model = ModelLoader.get_text_model()
+    encoded = model.tokenizer(texts, truncation=True, max_length=model.max_seq_length)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+def encode_text_batch(texts):
+    """一次前向计算整批文本 (调用方已按长度分好批)"""
+    model = ModelLoader.get_text_model()
+    return model.encode(texts, batch_size=len(texts), normalize_embeddings=True).tolist()
+
 def get_image_embedding(image):
     model, processor, _ = ModelLoader.get_clip_components()
     inputs = processor(images=image, return_tensors="pt")
@@ -57,9 +166,22 @@ def get_image_embedding(image):
 
 def get_text_embedding_for_clip(text):
     """用于以文搜图的文本 Embedding (使用 CLIP Text Encoder)"""
+    return encode_clip_text_batch([text])[0]
+
+def get_text_embeddings_for_clip(texts):
+    """批量版本：按 token 长度分桶后批量计算 CLIP Text Embedding"""
+    return encode_scheduled(list(texts), clip_token_lengths, encode_clip_text_batch)
+
+def clip_token_lengths(texts):
+    _, _, tokenizer = ModelLoader.get_clip_components()
+    encoded = tokenizer(list(texts), truncation=True)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+def encode_clip_text_batch(texts):
+    """一次前向计算整批文本的 CLIP Text Embedding"""
     model, _, tokenizer = ModelLoader.get_clip_components()
-    inputs = tokenizer([text], padding=True, return_tensors="pt")
+    inputs = tokenizer(list(texts), padding=True, truncation=True, return_tensors="pt")
     with torch.no_grad():
         text_features = model.get_text_features(**inputs)
     text_features = text_features / text_features.norm(p=2, dim=-1, keepdim=True)
-    return text_features[0].tolist()
+    return text_features.tolist()
@@ -1,23 +1,129 @@
 import fitz  # PyMuPDF
-from typing import List, Dict, Tuple
+import multiprocessing
+import os
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import deque
+from contextlib import nullcontext
+import sys
+import threading
+import time
+from typing import List, Dict, Tuple, Iterator
+from src.core.config import Config
+
+def _extract_page_range(pdf_path: str, start: int, end: int, doc=None) -> List[Tuple[int, str]]:
+    """
+    提取 [start, end) 区间 (0-based) 的页面文本。
+    定义在模块级以便被工作进程 pickle 调用；未传入 doc 时自行打开文件。
+    """
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(pdf_path)
+    try:
+        pages_content = []
+        for i in range(start, end):
+            text = doc.load_page(i).get_text()
+            # 简单的清理：去除多余空白
+            text = " ".join(text.split())
+            if text:
+                pages_content.append((i + 1, text))
+        return pages_content
+    finally:
+        if own_doc:
+            doc.close()
+
+
+# 同一时刻只允许一张需要全尺寸解码的大图在内存中 (见 Processor.load_image)
+_large_decode_slot = threading.Semaphore(1)
+
+
+def _peak_rss_mb():
+    """当前进程的峰值 RSS (MB)；没有 resource 模块的平台 (Windows) 返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _decode_benchmark_worker(image_paths: List[str], min_side: int = None):
+    """
+    在独立进程中逐张解码，返回 (每张耗时毫秒, 解码前峰值 RSS, 解码后峰值 RSS)。
+    min_side 为 None 时按原来的方式全分辨率解码。
+    """
+    rss_before = _peak_rss_mb()
+    times = []
+    for path in image_paths:
+        start = time.perf_counter()
+        try:
+            if min_side is None:
+                with Image.open(path) as img:
+                    img.convert("RGB")
+            else:
+                Processor.load_image(path, min_side)
+        except Exception:
+            continue
+        times.append((time.perf_counter() - start) * 1000)
+    return times, rss_before, _peak_rss_mb()
+
+
+# extract_workers 为 0 时的默认进程数上限：每个工作进程都是独立的解释器，数量过多只会增加内存占用
+DEFAULT_MAX_EXTRACT_WORKERS = 4
+
 
 class Processor:
+    # PDF 分片提取的进程池按进程数缓存，ingest 中的多篇大 PDF 共用同一组工作进程
+    _extract_executors = {}
+    _extract_lock = threading.Lock()
+
     @staticmethod
     def extract_text_with_page(pdf_path: str) -> List[Tuple[int, str]]:
         """
         使用 PyMuPDF (fitz) 提取 PDF 文本，保留页码信息。
         返回: List[(page_number, page_text)]，页码从 1 开始。
+        页数达到 pdf_shard_min_pages 时按页码区间切分到多个进程并行提取，小文件仍走单进程。
         """
-        doc = fitz.open(pdf_path)
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+            if page_count < Config.get("pdf_shard_min_pages"):
+                return _extract_page_range(pdf_path, 0, page_count, doc)
+        return Processor.extract_text_sharded(pdf_path, page_count)
+
+    @staticmethod
+    def extract_text_sharded(pdf_path: str, page_count: int, workers: int = None) -> List[Tuple[int, str]]:
+        """
+        按页码区间分片，每个工作进程独立打开 PDF 提取自己的区间，最后按页码顺序合并。
+        工作进程使用 spawn 启动，不继承父进程已加载的模型与线程 (fork 后使用不安全)。
+        spawn 会重新导入启动脚本，因此 main.py 顶层不导入模型相关模块，工作进程只加载本模块 (PyMuPDF / PIL)。
+        """
+        workers = workers or Config.get("extract_workers") or min(os.cpu_count() or 1, DEFAULT_MAX_EXTRACT_WORKERS)
+        # 分片数略多于进程数，避免个别区间 (如扫描页、图表密集页) 拖慢整体
+        shard_size = max(1, -(-page_count // (workers * 4)))
+        ranges = [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+
+        executor = Processor._get_extract_executor(workers)
+        futures = [executor.submit(_extract_page_range, pdf_path, start, end) for start, end in ranges]
         pages_content = []
-        for i, page in enumerate(doc):
-            text = page.get_text()
-            # 简单的清理：去除多余空白
-            text = " ".join(text.split())
-            if text:
-                pages_content.append((i + 1, text))
+        for future in futures:
+            pages_content.extend(future.result())
         return pages_content
 
+    @staticmethod
+    def _get_extract_executor(workers: int) -> ProcessPoolExecutor:
+        """
+        懒加载并复用进程池：启动 spawn 进程需要重新初始化解释器，不能每篇 PDF 新建一次。
+        空闲的工作进程在解释器退出时由 concurrent.futures 自动回收。
+        """
+        with Processor._extract_lock:
+            executor = Processor._extract_executors.get(workers)
+            if executor is None:
+                context = multiprocessing.get_context("spawn")
+                executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+                Processor._extract_executors[workers] = executor
+            return executor
+
     @staticmethod
     def chunk_text(pages_content: List[Tuple[int, str]], chunk_size: int = 500, overlap: int = 50) -> List[Dict]:
         """
@@ -87,3 +193,89 @@ class Processor:
         for _, text in pages_content[:2]:
             candidate_text += text + " "
         return candidate_text[:2000]
+
+    @staticmethod
+    def load_image(image_path: str, min_side: int = None) -> Image.Image:
+        """
+        读取图片并转为 RGB。
+        :param min_side: 模型实际需要的最短边 (CLIP 224, BLIP 384)。提供时走低分辨率解码：
+            JPEG 使用 draft 模式在 DCT 阶段直接按 1/2、1/4、1/8 缩小解码，
+            其他格式解码后缩放到最短边为 min_side，后续 Processor 的 resize 基本不再有开销。
+        超过 image_max_pixels 的图片只读文件头即拒绝，避免巨型图片撑爆内存。
+        """
+        with Image.open(image_path) as img:
+            width, height = img.size
+            max_pixels = Config.get("image_max_pixels")
+            if width * height > max_pixels:
+                raise ValueError(f"Image too large: {width}x{height} exceeds {max_pixels} pixels")
+
+            if min_side:
+                # draft 只对 JPEG 生效，保证解码结果两边都 >= min_side
+                img.draft("RGB", (min_side, min_side))
+
+            # PNG / BMP / WebP 等无法降分辨率解码，只能全尺寸解码后再缩放。
+            # 这类大图同一时刻只允许一张在解码，峰值内存不随 decode_workers 增长
+            decode_pixels = img.size[0] * img.size[1]
+            large = decode_pixels > Config.get("image_large_decode_pixels")
+            with _large_decode_slot if large else nullcontext():
+                image = img.convert("RGB")
+                if min_side and min(image.size) > min_side:
+                    scale = min_side / min(image.size)
+                    new_size = (max(min_side, round(image.width * scale)), max(min_side, round(image.height * scale)))
+                    image = image.resize(new_size, Image.BICUBIC, reducing_gap=3.0)
+        return image
+
+    @staticmethod
+    def iter_images(image_paths: List[str], min_side: int = None, workers: int = None) -> Iterator[Tuple[str, object]]:
+        """
+        使用线程池并行解码图片，与调用方的模型推理重叠执行。
+        按输入顺序 yield (path, PIL.Image 或 Exception)；同一时刻最多预取 2 * workers 张 (已缩放到 min_side)，
+        需要全尺寸解码的大图 (image_large_decode_pixels) 同一时刻只有一张，峰值内存有界。
+        """
+        workers = workers or Config.get("decode_workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            paths = iter(image_paths)
+
+            def submit_next():
+                path = next(paths, None)
+                if path is not None:
+                    pending.append((path, executor.submit(Processor.load_image, path, min_side)))
+
+            for _ in range(2 * workers):
+                submit_next()
+
+            while pending:
+                path, future = pending.popleft()
+                submit_next()
+                try:
+                    yield path, future.result()
+                except Exception as e:
+                    yield path, e
+
+    @staticmethod
+    def benchmark_decode(image_paths: List[str], min_side: int = 224):
+        """
+        对比全分辨率解码与低分辨率解码的单张耗时和峰值内存。
+        两种方式各在一个新进程 (spawn) 中运行，峰值 RSS 互不影响。
+        """
+        results = {}
+        context = multiprocessing.get_context("spawn")
+        for label, side in (("full", None), (f"reduced ({min_side}px)", min_side)):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                times, rss_before, rss_after = executor.submit(_decode_benchmark_worker, image_paths, side).result()
+            if not times:
+                print("No images decoded.")
+                return results
+            times.sort()
+            row = {
+                "images": len(times),
+                "mean_ms": sum(times) / len(times),
+                "p50_ms": times[len(times) // 2],
+                "peak_rss_mb": None if rss_after is None else rss_after - rss_before,
+            }
+            results[label] = row
+            rss = "n/a" if row["peak_rss_mb"] is None else f"{row['peak_rss_mb']:.1f} MB"
+            print(f"{label:<18} {row['images']:>5} images  mean {row['mean_ms']:7.2f} ms  "
+                  f"p50 {row['p50_ms']:7.2f} ms  peak RSS +{rss}")
+        return results
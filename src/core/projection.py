@@ -0,0 +1,262 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import Dict, Iterator, List, Tuple
+from src.core.config import Config
+
+# 投影文件格式版本
+PROJECTION_VERSION = 1
+
+# 投影后的 collection 在 metadata 中记录所用投影的指纹，打开时校验
+FINGERPRINT_KEY = "lma:projection"
+
+
+def shared_file(filename: str) -> str:
+    """投影相关文件必须放在所有客户端共用的目录 (shared_path)，否则各客户端会使用不同的投影"""
+    directory = Config.shared_dir()
+    if directory is None:
+        raise ValueError("Projection requires shared_path in server mode: "
+                         "set it to the index server's db_path (e.g. LMA_SHARED_PATH=/data/lma/chroma_db).")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
+
+
+class Projection:
+    """
+    在语料样本上拟合的 PCA 线性投影：x -> normalize((x - mean) @ components)。
+    投影后重新归一化，使 L2 距离排序仍与 Cosine 相似度一致 (与原始 embedding 的用法相同)。
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained_variance: float = None):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.explained_variance = explained_variance
+
+    @property
+    def input_dim(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def output_dim(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def fingerprint(self) -> str:
+        """mean 与 components 的哈希，用于确认客户端的投影与服务端 collection 中的向量一致"""
+        digest = hashlib.sha256(self.mean.tobytes())
+        digest.update(self.components.tobytes())
+        return digest.hexdigest()[:16]
+
+    @classmethod
+    def fit(cls, sample: np.ndarray, dim: int) -> "Projection":
+        sample = np.asarray(sample, dtype=np.float32)
+        if dim >= sample.shape[1]:
+            raise ValueError(f"Projection dim {dim} must be smaller than embedding dim {sample.shape[1]}")
+        if sample.shape[0] < dim:
+            raise ValueError(f"Need at least {dim} samples to fit a {dim}-d projection, got {sample.shape[0]}")
+        mean = sample.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(sample - mean, full_matrices=False)
+        variance = singular_values ** 2
+        explained = float(variance[:dim].sum() / variance.sum())
+        return cls(mean, vt[:dim].T, explained)
+
+    def transform(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        projected = (vectors - self.mean) @ self.components
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def path_for(name: str, dim: int) -> str:
+        return shared_file(f"projection_{name}_{dim}.npz")
+
+    def save(self, path: str):
+        np.savez(path, version=PROJECTION_VERSION, mean=self.mean, components=self.components,
+                 explained_variance=float(self.explained_variance or 0.0), created_at=time.time())
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        with np.load(path) as data:
+            if int(data["version"]) != PROJECTION_VERSION:
+                raise ValueError(f"Unsupported projection version: {int(data['version'])}")
+            return cls(data["mean"], data["components"], float(data["explained_variance"]))
+
+
+class FullVectorStore:
+    """
+    启用降维后全维度 embedding 的旁路存储 (SQLite，shared_path 下的 vectors_<name>.sqlite，float16)。
+    只按 id 存取，不建 HNSW 索引：查询只用投影后的 collection，全维度向量仅用于重新拟合、评估、
+    export-index 与 drop-projection 恢复全维度 collection。
+    state 表记录当前生效的投影维度，0 或文件不存在表示未启用降维。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return shared_file(f"vectors_{self.name}.sqlite")
+
+    def exists(self) -> bool:
+        directory = Config.shared_dir()
+        return directory is not None and os.path.exists(os.path.join(directory, f"vectors_{self.name}.sqlite"))
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL: 与 DocStore 相同，导入与查询进程可以同时读写
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS vectors (id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @property
+    def active_dim(self) -> int:
+        if not self.exists():
+            return 0
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM state WHERE key = 'dim'").fetchone()
+        return int(row[0]) if row else 0
+
+    def set_active_dim(self, dim: int):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('dim', ?)", (str(dim),))
+            self.conn.commit()
+
+    def put_many(self, ids: List[str], embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float16)
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO vectors (id, data) VALUES (?, ?)",
+                                  [(i, v.tobytes()) for i, v in zip(ids, vectors)])
+            self.conn.commit()
+
+    def get_many(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self.conn.execute(f"SELECT id, data FROM vectors WHERE id IN ({placeholders})", list(ids)).fetchall()
+        return {i: np.frombuffer(data, dtype=np.float16).astype(np.float32) for i, data in rows}
+
+    def delete_many(self, ids: List[str]):
+        if not ids:
+            return
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            self.conn.execute(f"DELETE FROM vectors WHERE id IN ({placeholders})", list(ids))
+            self.conn.commit()
+
+    def count(self) -> int:
+        if not self.exists():
+            return 0
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def iter_pages(self, page_size: int) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """按 id 顺序分页读取全部向量"""
+        last_id = ""
+        while True:
+            with self._lock:
+                rows = self.conn.execute("SELECT id, data FROM vectors WHERE id > ? ORDER BY id LIMIT ?",
+                                         (last_id, page_size)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [r[0] for r in rows], np.stack([np.frombuffer(r[1], dtype=np.float16) for r in rows]).astype(np.float32)
+
+    def sample(self, n: int) -> np.ndarray:
+        with self._lock:
+            rows = self.conn.execute("SELECT data FROM vectors ORDER BY RANDOM() LIMIT ?", (n,)).fetchall()
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([np.frombuffer(r[0], dtype=np.float16) for r in rows]).astype(np.float32)
+
+    def drop(self):
+        """删除旁路文件 (drop-projection 把向量写回全维度 collection 之后)"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+
+class ProjectedCollection:
+    """
+    对写入与查询的 embedding 统一做投影，调用方 (add_paper / index_images / 两条查询路径) 无需修改。
+    HNSW 中只有投影后的向量；全维度向量写入 FullVectorStore (不建索引)，
+    get 返回的 embedding 从中读取，因此 export-index 导出的仍是全维度向量。
+    """
+
+    def __init__(self, name: str, collection, projection: Projection, vectors: FullVectorStore):
+        self.name = name
+        self._collection = collection
+        self.projection = projection
+        self.vectors = vectors
+
+    def __getattr__(self, attr):
+        return getattr(self._collection, attr)
+
+    def _project(self, embeddings):
+        if embeddings is None:
+            return None
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.shape[1] != self.projection.input_dim:
+            raise ValueError(f"Embedding dim {vectors.shape[1]} does not match projection "
+                             f"{self.projection.input_dim} -> {self.projection.output_dim}")
+        return self.projection.transform(vectors).tolist()
+
+    def _write(self, method: str, ids, embeddings=None, metadatas=None, documents=None):
+        projected = self._project(embeddings)
+        if embeddings is not None:
+            # 先写全维度向量：投影 collection 写入失败时，可用 fit-projection / drop-projection 重建
+            self.vectors.put_many(ids, embeddings)
+        return getattr(self._collection, method)(ids=ids, embeddings=projected,
+                                                 metadatas=metadatas, documents=documents)
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        return self._write("add", ids, embeddings, metadatas, documents)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        return self._write("upsert", ids, embeddings, metadatas, documents)
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None):
+        return self._write("update", ids, embeddings, metadatas, documents)
+
+    def delete(self, ids=None, where=None, where_document=None):
+        if where is not None or where_document is not None:
+            # 按条件删除时先解析出 id，旁路中的全维度向量才能一并删除
+            ids = self._collection.get(ids=ids, where=where, where_document=where_document, include=[])["ids"]
+        if not ids:
+            return None
+        result = self._collection.delete(ids=ids)
+        self.vectors.delete_many(ids)
+        return result
+
+    def get(self, ids=None, where=None, limit=None, offset=None, where_document=None, include=None):
+        kwargs = {"ids": ids, "where": where, "limit": limit, "offset": offset, "where_document": where_document}
+        if include is not None:
+            kwargs["include"] = include
+        result = self._collection.get(**kwargs)
+        if include is not None and "embeddings" in include and result["ids"]:
+            full = self.vectors.get_many(result["ids"])
+            missing = [i for i in result["ids"] if i not in full]
+            if missing:
+                raise KeyError(f"Full-dimension vectors missing for {len(missing)} ids in {self.name} (e.g. {missing[0]})")
+            result["embeddings"] = [full[i].tolist() for i in result["ids"]]
+        return result
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, where_document=None, include=None):
+        kwargs = {"query_embeddings": self._project(query_embeddings), "n_results": n_results,
+                  "where": where, "where_document": where_document}
+        if include is not None:
+            kwargs["include"] = include
+        return self._collection.query(**kwargs)
@@ -0,0 +1,154 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+# get / query 结果中按条目对齐的字段
+RESULT_FIELDS = ("ids", "embeddings", "metadatas", "documents", "distances", "uris", "data")
+
+
+class ShardedCollection:
+    """
+    把一个逻辑 collection 按 id 哈希分散到 N 个独立 collection (分片)。
+    写入按分片分组后并行执行；查询向所有分片并行发出 (scatter)，再按距离合并 top-k (gather)。
+    对外提供与 Chroma Collection 相同的 add / upsert / get / query / delete / count 接口，调用方无需修改。
+    """
+
+    def __init__(self, name: str, shards: List, executor: ThreadPoolExecutor = None):
+        self.name = name
+        self.shards = shards
+        self._executor = executor or ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix=f"{name}-shard")
+
+    @staticmethod
+    def shard_of(record_id: str, num_shards: int) -> int:
+        # 不能用内置 hash()：字符串哈希在每个进程中随机化，跨进程不稳定
+        return zlib.crc32(record_id.encode("utf-8")) % num_shards
+
+    def _partition(self, ids: List[str]) -> Dict[int, List[int]]:
+        groups = {}
+        for i, record_id in enumerate(ids):
+            groups.setdefault(self.shard_of(record_id, len(self.shards)), []).append(i)
+        return groups
+
+    def _map(self, fn, shard_indices):
+        """在线程池中对各分片并行执行 fn(shard_index)，按分片顺序返回结果"""
+        futures = [self._executor.submit(fn, i) for i in shard_indices]
+        return [f.result() for f in futures]
+
+    def _write(self, method: str, ids, embeddings=None, metadatas=None, documents=None):
+        groups = self._partition(ids)
+
+        def pick(values, positions):
+            return None if values is None else [values[p] for p in positions]
+
+        def write_shard(shard_idx):
+            positions = groups[shard_idx]
+            getattr(self.shards[shard_idx], method)(
+                ids=pick(ids, positions),
+                embeddings=pick(embeddings, positions),
+                metadatas=pick(metadatas, positions),
+                documents=pick(documents, positions)
+            )
+
+        self._map(write_shard, list(groups))
+
+    def add(self, ids, embeddings=None, metadatas=None, documents=None):
+        self._write("add", ids, embeddings, metadatas, documents)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None):
+        self._write("upsert", ids, embeddings, metadatas, documents)
+
+    def update(self, ids, embeddings=None, metadatas=None, documents=None):
+        self._write("update", ids, embeddings, metadatas, documents)
+
+    def delete(self, ids=None, where=None, where_document=None):
+        if ids is not None:
+            groups = self._partition(ids)
+            self._map(lambda i: self.shards[i].delete(ids=[ids[p] for p in groups[i]], where=where,
+                                                      where_document=where_document), list(groups))
+        else:
+            self._map(lambda i: self.shards[i].delete(where=where, where_document=where_document),
+                      range(len(self.shards)))
+
+    def count(self) -> int:
+        return sum(self._map(lambda i: self.shards[i].count(), range(len(self.shards))))
+
+    def get(self, ids=None, where=None, limit=None, offset=None, where_document=None, include=None):
+        kwargs = {"where": where, "where_document": where_document}
+        if include is not None:
+            kwargs["include"] = include
+
+        if ids is not None:
+            groups = self._partition(ids)
+            parts = self._map(lambda i: self.shards[i].get(ids=[ids[p] for p in groups[i]], **kwargs), list(groups))
+            return self._concat(parts)
+
+        if where is None and where_document is None and (limit is not None or offset is not None):
+            # 无过滤条件时按分片顺序分页：根据各分片条数直接定位，无需读取前面的数据
+            offset = offset or 0
+            remaining = limit
+            parts = []
+            for shard in self.shards:
+                size = shard.count()
+                if offset >= size:
+                    offset -= size
+                    continue
+                take = size - offset if remaining is None else min(remaining, size - offset)
+                parts.append(shard.get(limit=take, offset=offset, **kwargs))
+                offset = 0
+                if remaining is not None:
+                    remaining -= take
+                    if remaining <= 0:
+                        break
+            return self._concat(parts)
+
+        parts = self._map(lambda i: self.shards[i].get(**kwargs), range(len(self.shards)))
+        result = self._concat(parts)
+        if limit is not None or offset is not None:
+            start = offset or 0
+            end = None if limit is None else start + limit
+            for field in RESULT_FIELDS:
+                if result.get(field) is not None:
+                    result[field] = result[field][start:end]
+        return result
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, where_document=None, include=None):
+        include = list(include) if include is not None else ["metadatas", "documents", "distances"]
+        # 合并 top-k 需要距离；调用方没要求时在结果中去掉
+        shard_include = include if "distances" in include else include + ["distances"]
+
+        # n_results 直接传给各分片：Chroma 会按分片实际条数截断 (空分片返回空结果)，
+        # 不必每次查询前再对所有分片调用 count()，避免多出 N 次往返
+        def query_shard(shard_idx):
+            return self.shards[shard_idx].query(
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                where_document=where_document,
+                include=shard_include
+            )
+
+        parts = self._map(query_shard, range(len(self.shards)))
+
+        merged = {field: [] for field in ("ids",) + tuple(include) if field in RESULT_FIELDS}
+        for q in range(len(query_embeddings)):
+            candidates = []
+            for part in parts:
+                for j, distance in enumerate(part["distances"][q]):
+                    candidates.append((distance, part, j))
+            candidates.sort(key=lambda c: c[0])
+            top = candidates[:n_results]
+            for field in merged:
+                merged[field].append([part[field][q][j] for _, part, j in top])
+        for field in RESULT_FIELDS:
+            merged.setdefault(field, None)
+        return merged
+
+    @staticmethod
+    def _concat(parts):
+        result = {}
+        for field in RESULT_FIELDS:
+            values = [p.get(field) for p in parts]
+            result[field] = None if all(v is None for v in values) else [x for v in values if v for x in v]
+        if result["ids"] is None:
+            result["ids"] = []
+        return result
@@ -0,0 +1,169 @@
+import json
+import time
+import numpy as np
+from typing import List
+from src.core.database import db
+from src.core.doc_store import doc_store
+
+# 快照格式版本，格式变化时递增，导入时校验
+# 2: manifest 中记录导出时各 collection 使用的投影 (embedding 本身始终为全维度)
+SNAPSHOT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+
+# 导出时每次从 ChromaDB 读取的条数
+EXPORT_PAGE_SIZE = 5000
+
+
+def _pack_strings(values: List[str]):
+    """字符串列 -> (utf-8 拼接字节, 偏移数组)，比定长 unicode 数组紧凑得多"""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+
+class Snapshot:
+    """
+    索引快照：两个 collection 的 embedding (float16) + 列式 metadata / documents，
+    保存为单个 .npz 文件。导入时直接批量写库，不需要加载任何模型。
+    启用降维时导出的仍是全维度 embedding (从全维度向量旁路文件读取)，导入方可以使用不同的投影或不降维。
+    """
+    COLLECTIONS = {
+        "papers": db.get_paper_collection,
+        "images": db.get_image_collection,
+    }
+
+    @staticmethod
+    def export_index(output_path: str, compress: bool = True):
+        arrays = {}
+        manifest = {"version": SNAPSHOT_VERSION, "created_at": time.time(), "collections": {}}
+
+        for name, get_collection in Snapshot.COLLECTIONS.items():
+            collection = get_collection()
+            total = collection.count()
+            print(f"Exporting {name}: {total} records...")
+
+            ids, documents, metadatas = [], [], []
+            embeddings = None
+            offset = 0
+            while offset < total:
+                page = collection.get(
+                    include=["embeddings", "metadatas", "documents"],
+                    limit=EXPORT_PAGE_SIZE,
+                    offset=offset
+                )
+                if not page["ids"]:
+                    break
+                page_emb = np.asarray(page["embeddings"], dtype=np.float16)
+                if embeddings is None:
+                    embeddings = np.empty((total, page_emb.shape[1]), dtype=np.float16)
+                embeddings[offset:offset + len(page_emb)] = page_emb
+                page_docs = page["documents"] or [None] * len(page["ids"])
+                if name == "papers":
+                    # 论文原文可能存放在 DocStore 中，快照里统一带上原文
+                    stored = doc_store.get_many([i for i, d in zip(page["ids"], page_docs) if d is None])
+                    page_docs = [d if d is not None else stored.get(i) for i, d in zip(page["ids"], page_docs)]
+                ids.extend(page["ids"])
+                documents.extend(d or "" for d in page_docs)
+                metadatas.extend(m or {} for m in page["metadatas"])
+                offset += len(page["ids"])
+
+            count = len(ids)
+            if embeddings is None:
+                embeddings = np.empty((0, 0), dtype=np.float16)
+            arrays[f"{name}.embeddings"] = embeddings[:count]
+            arrays[f"{name}.ids"], arrays[f"{name}.ids_offsets"] = _pack_strings(ids)
+            arrays[f"{name}.documents"], arrays[f"{name}.documents_offsets"] = _pack_strings(documents)
+
+            # 列式 metadata: {key: [value 或 None, ...]}
+            keys = sorted({k for m in metadatas for k in m})
+            columns = {k: [m.get(k) for m in metadatas] for k in keys}
+            arrays[f"{name}.metadatas"] = np.frombuffer(json.dumps(columns).encode("utf-8"), dtype=np.uint8)
+
+            projection = getattr(collection, "projection", None)
+            manifest["collections"][name] = {
+                "count": count,
+                "dim": int(embeddings.shape[1]),
+                "projection": None if projection is None else {
+                    "input_dim": projection.input_dim,
+                    "output_dim": projection.output_dim,
+                    "explained_variance": projection.explained_variance,
+                    "fingerprint": projection.fingerprint,
+                },
+            }
+
+        arrays["manifest"] = np.frombuffer(json.dumps(manifest).encode("utf-8"), dtype=np.uint8)
+
+        save = np.savez_compressed if compress else np.savez
+        with open(output_path, "wb") as f:
+            save(f, **arrays)
+        print(f"Snapshot written to {output_path}")
+
+    @staticmethod
+    def import_index(snapshot_path: str, batch_size: int = None):
+        with np.load(snapshot_path) as data:
+            manifest = json.loads(data["manifest"].tobytes().decode("utf-8"))
+            if manifest.get("version") not in SUPPORTED_VERSIONS:
+                raise ValueError(f"Unsupported snapshot version: {manifest.get('version')} (expected {SUPPORTED_VERSIONS})")
+
+            batch_size = batch_size or getattr(db.client, "max_batch_size", 5000)
+
+            for name, info in manifest["collections"].items():
+                if name not in Snapshot.COLLECTIONS:
+                    print(f"Skipping unknown collection: {name}")
+                    continue
+                count = info["count"]
+                print(f"Importing {name}: {count} records...")
+                if count == 0:
+                    continue
+
+                embeddings = data[f"{name}.embeddings"]
+                ids = _unpack_strings(data[f"{name}.ids"], data[f"{name}.ids_offsets"])
+                documents = _unpack_strings(data[f"{name}.documents"], data[f"{name}.documents_offsets"])
+                columns = json.loads(data[f"{name}.metadatas"].tobytes().decode("utf-8"))
+                metadatas = [
+                    {k: values[i] for k, values in columns.items() if values[i] is not None}
+                    for i in range(count)
+                ]
+
+                collection = Snapshot.COLLECTIONS[name]()
+                Snapshot._check_dim(name, info, collection)
+                # 与 add_paper 一致：启用 DocStore 时论文原文不写入向量库
+                use_doc_store = name == "papers" and doc_store.enabled
+                start_time = time.perf_counter()
+                for start in range(0, count, batch_size):
+                    end = min(start + batch_size, count)
+                    if use_doc_store:
+                        doc_store.put_many(ids[start:end], documents[start:end])
+                    collection.upsert(
+                        ids=ids[start:end],
+                        embeddings=embeddings[start:end].astype(np.float32).tolist(),
+                        metadatas=metadatas[start:end],
+                        documents=None if use_doc_store else documents[start:end]
+                    )
+                    print(f" -> {end}/{count}", end="\r", flush=True)
+                print(f" -> Imported {count} records in {time.perf_counter() - start_time:.1f}s")
+
+    @staticmethod
+    def _check_dim(name: str, info: dict, collection):
+        """
+        导入前校验快照的 embedding 维度与当前 collection 的投影配置一致。
+        版本 1 的快照可能是从降维后的库导出的 (投影维度的向量)，无法再写入全维度 collection。
+        """
+        snapshot_projection = info.get("projection")
+        if snapshot_projection is not None and info["dim"] != snapshot_projection["input_dim"]:
+            raise ValueError(f"Snapshot {name} embeddings are {info['dim']}-d but its projection expects "
+                             f"{snapshot_projection['input_dim']}-d input")
+        projection = getattr(collection, "projection", None)
+        if projection is not None and info["dim"] != projection.input_dim:
+            raise ValueError(f"Snapshot {name} embeddings are {info['dim']}-d, but the configured projection "
+                             f"expects {projection.input_dim}-d input. Import with projection disabled "
+                             f"({name[:-1]}_projection_dim=0) or re-export from a full-dimension store.")
+        if snapshot_projection is not None and projection is None:
+            print(f" -> Snapshot was exported with a {snapshot_projection['output_dim']}-d projection; "
+                  f"importing full-dimension vectors (run fit-projection to enable it here).")
@@ -1,22 +1,32 @@
 import os
-from PIL import Image
+from typing import Dict, List, Union
 from src.core.database import db
 from src.core.model_loader import get_image_embedding, get_text_embedding_for_clip
+from src.core.processor import Processor
 import glob
+import time
+
+# 模型实际使用的输入分辨率 (最短边)，解码时不必超过该尺寸
+CLIP_IMAGE_SIZE = 224
+BLIP_IMAGE_SIZE = 384
 
 class ImageService:
     @staticmethod
-    def index_images(folder_path: str):
+    def index_images(folder_path: Union[str, List[str]]) -> Dict[str, str]:
         """
         索引指定文件夹下的所有图片
+        :param folder_path: 文件夹、单个图片，或图片路径列表 (批量导入时一次传入全部图片，解码才能与推理重叠)
+        :return: {图片路径: 失败原因}，成功的图片值为 None
         """
-        if not os.path.isdir(folder_path):
+        if isinstance(folder_path, (list, tuple)):
+            files = list(folder_path)
+        elif not os.path.isdir(folder_path):
             # 支持单个文件
             if os.path.isfile(folder_path):
                 files = [folder_path]
             else:
                 print(f"Error: {folder_path} is not a valid path.")
-                return
+                return {}
         else:
             # 扫描常见图片格式
             exts = ['*.jpg', '*.jpeg', '*.png', '*.bmp', '*.webp']
@@ -27,14 +37,26 @@ class ImageService:
         print(f"Found {len(files)} images to index.")
         
         collection = db.get_image_collection()
+        start_time = time.perf_counter()
+        decode_wait = 0.0
+        statuses = {}
         
-        for file_path in files:
+        # 后台线程池按 CLIP 输入分辨率解码，主线程只做推理与入库
+        decoded = Processor.iter_images(files, min_side=CLIP_IMAGE_SIZE)
+        while True:
+            wait_start = time.perf_counter()
+            item = next(decoded, None)
+            decode_wait += time.perf_counter() - wait_start
+            if item is None:
+                break
+            file_path, image = item
             try:
                 filename = os.path.basename(file_path)
                 print(f"Indexing: {filename}...", end="", flush=True)
                 
-                # Load image
-                image = Image.open(file_path).convert("RGB")
+                # 解码失败 (损坏 / 超大图片) 时这里拿到的是异常
+                if isinstance(image, Exception):
+                    raise image
                 
                 # Get Embedding
                 emb = get_image_embedding(image)
@@ -47,8 +69,15 @@ class ImageService:
                     documents=[filename] # Chroma needs a document usually, just use filename
                 )
                 print(" Done.")
+                statuses[file_path] = None
             except Exception as e:
                 print(f" Failed: {e}")
+                statuses[file_path] = str(e)
+        
+        if len(files) > 1:
+            elapsed = time.perf_counter() - start_time
+            print(f"Indexed {len(files)} images in {elapsed:.2f}s (waiting on decode: {decode_wait:.2f}s)")
+        return statuses
 
     @staticmethod
     def search_image(query: str, top_k: int = 3):
@@ -57,12 +86,11 @@ class ImageService:
         """
         print(f"Searching for image: '{query}'")
         
-        # 使用 CLIP 的 Text Encoder 获取查询向量
-        text_emb = get_text_embedding_for_clip(query)
-        
+        # 使用 CLIP 的 Text Encoder 获取查询向量 (缓存未命中时才计算)
         collection = db.get_image_collection()
-        results = collection.query(
-            query_embeddings=[text_emb],
+        results = collection.query_text(
+            query,
+            get_text_embedding_for_clip,
             n_results=top_k
         )
         
@@ -95,7 +123,7 @@ class ImageService:
             if not os.path.exists(image_path):
                 return "Error: Image file not found."
 
-            raw_image = Image.open(image_path).convert('RGB')
+            raw_image = Processor.load_image(image_path, min_side=BLIP_IMAGE_SIZE)
             
             # Prepare inputs
             # encoding
@@ -1,7 +1,8 @@
 import os
 import shutil
-from typing import List
+from typing import Dict, List
 from src.core.database import db
+from src.core.doc_store import doc_store
 from src.core.model_loader import get_text_embedding
 from src.core.processor import Processor
 from sentence_transformers.util import cos_sim
@@ -137,12 +138,26 @@ class PaperService:
                 meta["path"] = final_path
 
         # 7. 存入 ChromaDB
-        collection.add(
+        # 同名论文重新导入时用 upsert 覆盖同 id 的 chunk；写入成功后再删除新版本中已不存在的旧 chunk，
+        # 写入失败时旧索引保持完整
+        previous_ids = collection.get(where={"filename": filename}, include=[])["ids"]
+        # 启用旁路文档存储时，原文压缩存入 DocStore，向量库只保存 embedding 与 metadata
+        if doc_store.enabled:
+            doc_store.put_many(ids, documents)
+            documents = None
+        collection.upsert(
             ids=ids,
             embeddings=final_embeddings,
             metadatas=metadatas,
             documents=documents
         )
+        new_ids = set(ids)
+        stale_ids = [i for i in previous_ids if i not in new_ids]
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+            if doc_store.enabled:
+                doc_store.delete_many(stale_ids)
+            print(f" -> Removed {len(stale_ids)} stale chunks from the previous version.")
         print(f" -> Indexed {len(ids)} chunks.")
 
     @staticmethod
@@ -151,12 +166,14 @@ class PaperService:
         搜索论文
         """
         print(f"Searching for: {query}")
-        query_embedding = get_text_embedding(query)
-        
         collection = db.get_paper_collection()
-        results = collection.query(
-            query_embeddings=[query_embedding],
+        # 相同查询在两次写入之间直接命中缓存，不再重复编码与检索
+        results = collection.query_text(
+            query,
+            get_text_embedding,
             n_results=top_k,
+            # 只取 id / metadata / 距离，片段文本按需从 DocStore 读取
+            include=["metadatas", "distances"]
             # 可以过滤掉 is_summary (可选)，或者让 summary 排在前面
             # where={"is_summary": False} 
         )
@@ -167,11 +184,13 @@ class PaperService:
             print("No results found.")
             return
 
+        snippets = PaperService.fetch_texts(results['ids'][0], max_chars=200)
+
         print(f"\nTop {top_k} Results:")
         print("-" * 50)
         for i in range(len(results['ids'][0])):
             meta = results['metadatas'][0][i]
-            doc = results['documents'][0][i]
+            doc = snippets.get(results['ids'][0][i], "")
             score = results['distances'][0][i] # Cosine distance (lower is better usually, depends on space)
             # ChromaDB cosine space: 1 - cosine_similarity. So lower is closer. 0 means identical.
             
@@ -182,3 +201,19 @@ class PaperService:
             # print(f"Distance: {score:.4f}")
             print(f"Content: {doc[:200].replace(chr(10), ' ')}...") # 只显示前200字符
             print("-" * 50)
+
+    @staticmethod
+    def fetch_texts(ids: List[str], max_chars: int = None) -> Dict[str, str]:
+        """
+        按 chunk id 读取原文 (只用于实际展示的结果)。
+        优先读 DocStore；旧数据 (启用 DocStore 之前入库的) 回退到 ChromaDB 中的 document。
+        :param max_chars: 只需要片段时传入，减少解压与传输
+        """
+        texts = doc_store.get_many(ids, max_chars=max_chars) if doc_store.enabled else {}
+        missing = [i for i in ids if i not in texts]
+        if missing:
+            legacy = db.get_paper_collection().get(ids=missing, include=["documents"])
+            for record_id, doc in zip(legacy["ids"], legacy["documents"] or []):
+                if doc is not None:
+                    texts[record_id] = doc if max_chars is None else doc[:max_chars]
+        return texts